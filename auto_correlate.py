@@ -17,7 +17,7 @@ last_sensor = set()
 print("🧠 Auto-correlate started (every 30s). Ctrl+C to stop.")
 while True:
     try:
-        subprocess.run(["python3", os.path.join(SCRIPTS, "correlate.py"), "logs", REPORTS], check=True)
+        subprocess.run(["python3", os.path.join(SCRIPTS, "correlate.py"), "logs", REPORTS, "--incremental"], check=True)
     except Exception as e:
         print("correlate error:", e)
     # check findings
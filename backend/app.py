@@ -1,126 +1,473 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
-import os, threading, time, sqlite3, subprocess
-from datetime import datetime, timedelta
-from db import init_db, get_db
-from flask import send_file
-import io
+import os, threading, time, sqlite3, subprocess, heapq, platform
+import psutil
+from datetime import datetime
+from db import init_db, get_db, DB_PATH
+from schema import INCIDENT_REF
+import io, json, zlib, csv, html, zipfile
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["ETag", "X-Next-Cursor", "X-Alerts-Version"])
 
 # --- CONFIGURATION ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, '..'))
 REPORTS_DIR = os.path.join(ROOT_DIR, 'reports')
 TIMELINE_PATH = os.path.join(REPORTS_DIR, 'timeline.csv')
-SLA_POLICY = {"HIGH": 15, "MEDIUM": 60, "LOW": 240}
+LOGS_DIR = os.path.join(ROOT_DIR, 'logs')
+INGEST_STATE_PATH = os.path.join(REPORTS_DIR, 'ingest_state.json')
+RUN_STATS_PATH = os.path.join(REPORTS_DIR, 'correlate_stats.json')
 
 os.makedirs(REPORTS_DIR, exist_ok=True)
 
 # --- HELPER: SLA CALCULATION ---
-def calculate_sla_remaining(start_time_str, severity):
-    try:
-        clean_ts = start_time_str.replace('T', ' ')
-        start_dt = datetime.strptime(clean_ts, "%Y-%m-%d %H:%M:%S")
-        limit = SLA_POLICY.get(severity, 60)
-        deadline = start_dt + timedelta(minutes=limit)
-        diff = deadline - datetime.now()
-        seconds = int(diff.total_seconds())
-        if seconds < 0:
-            return "EXPIRED", "red"
-        return f"{seconds // 60}m {seconds % 60}s", "green"
-    except:
+def format_sla(seconds):
+    """Renders remaining SLA seconds (computed in SQL from sla_deadline)."""
+    if seconds is None:
         return "N/A", "gray"
+    if seconds < 0:
+        return "EXPIRED", "red"
+    return f"{seconds // 60}m {seconds % 60}s", "green"
+
+# --- FORENSIC TIMELINE STORE ---
+TIMELINE_EXPORT_SECONDS = 2
+TIMELINE_EXPORT_BATCH = 1000
+
+def record_timeline(cur, incident_id, description, source):
+    """Adds an analyst/system entry to the timeline table, in the caller's transaction.
+
+    timeline.csv is appended by timeline_exporter, not here.
+    """
+    log_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cur.execute("""
+        INSERT INTO timeline (ts_epoch, timestamp, incident_id, description, source)
+        VALUES (?, ?, ?, ?, ?)
+    """, (int(time.time()), log_time, incident_id, description, source))
+
+def export_timeline_batch(cur):
+    """Appends committed analyst/system entries past the export cursor to timeline.csv.
+
+    One thread writes the whole batch with a single write(), so lines from
+    concurrent requests can't interleave. The cursor moves only after the
+    write, so a crash repeats lines rather than losing them. The write lock is
+    taken before the cursor is read and held until the caller commits, so a
+    correlate.py rebuild (reset_timeline) can't truncate the file in between.
+    Returns the row count.
+    """
+    cur.execute("BEGIN IMMEDIATE")
+    cur.execute("SELECT last_id FROM export_cursors WHERE name = 'timeline_csv'")
+    row = cur.fetchone()
+    last_id = row[0] if row else 0
+    cur.execute("""
+        SELECT id, timestamp, incident_id, description FROM timeline
+        WHERE id > ? AND source != 'LOG' ORDER BY id LIMIT ?
+    """, (last_id, TIMELINE_EXPORT_BATCH))
+    rows = cur.fetchall()
+    if not rows:
+        return 0
+    with open(TIMELINE_PATH, 'a') as f:
+        f.write("".join(f"{ts}, {ref}, {desc}\n" for _, ts, ref, desc in rows))
+    cur.execute("INSERT OR REPLACE INTO export_cursors (name, last_id) VALUES ('timeline_csv', ?)", (rows[-1][0],))
+    return len(rows)
+
+def timeline_exporter():
+    while True:
+        try:
+            conn = get_db()
+            try:
+                while export_timeline_batch(conn.cursor()) == TIMELINE_EXPORT_BATCH:
+                    conn.commit()
+                conn.commit()
+            finally:
+                conn.close()  # rolls back a failed batch, releasing the write lock
+        except Exception as e:
+            print(f"⚠️ Timeline export error: {e}")
+        time.sleep(TIMELINE_EXPORT_SECONDS)
 
 # --- API: FORENSIC TIMELINE RECONSTRUCTION ---
+TIMELINE_PAGE_DEFAULT = 200
+TIMELINE_PAGE_MAX = 1000
+
 @app.route("/api/timeline", methods=["GET"])
 def get_timeline():
-    if not os.path.exists(TIMELINE_PATH):
-        return jsonify([])
-    events = []
+    """Newest-first page of timeline events.
+
+    Query params: limit, incident_id, and before/after (an event "seq").
+    `before` pages back through history; the next value is returned in the
+    X-Next-Cursor header. `after` fetches only events newer than the last one
+    a client has seen; a full page then sets X-Next-Cursor to its newest seq,
+    to pass as the next `after`. Both walk the (incident_id, id) /
+    primary-key indexes, so a page costs the same no matter how long the
+    timeline is.
+    """
     try:
-        with open(TIMELINE_PATH, 'r') as f:
-            for line in f.readlines():
-                parts = line.strip().split(',', 2)
-                if len(parts) >= 3:
-                    events.append({
-                        "timestamp": parts[0],
-                        "id": parts[1].strip(),
-                        "description": parts[2].strip()
-                    })
-        return jsonify(events[::-1])
+        limit = max(1, min(request.args.get("limit", TIMELINE_PAGE_DEFAULT, type=int), TIMELINE_PAGE_MAX))
+        before = request.args.get("before", type=int)
+        after = request.args.get("after", type=int)
+        incident_id = request.args.get("incident_id")
+
+        clauses, params = [], []
+        if incident_id:
+            clauses.append("incident_id = ?"); params.append(incident_id)
+        if before is not None:
+            clauses.append("id < ?"); params.append(before)
+        if after is not None:
+            clauses.append("id > ?"); params.append(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        # Events just after `after` come first, so a long gap is caught up page by page
+        order = "ASC" if after is not None and before is None else "DESC"
+
+        conn = get_db()
+        cur = conn.cursor()
+        cur.execute(f"SELECT id, timestamp, incident_id, description FROM timeline {where} ORDER BY id {order} LIMIT ?",
+                    params + [limit])
+        rows = cur.fetchall()
+        conn.close()
+        if order == "ASC":
+            rows.reverse()
+        response = jsonify([{"seq": seq, "timestamp": ts, "id": ref or "", "description": desc}
+                            for seq, ts, ref, desc in rows])
+        if rows and len(rows) == limit:
+            # rows are newest-first: continue before the oldest, or after the newest
+            response.headers["X-Next-Cursor"] = str(rows[0][0] if order == "ASC" else rows[-1][0])
+        return response
     except Exception as e:
         return jsonify([{"timestamp": str(datetime.now()), "description": f"Log Error: {e}"}])
 
 # --- API: ALERT MANAGEMENT ---
+ALERTS_PAGE_DEFAULT = 100
+ALERTS_PAGE_MAX = 1000
+ALERT_COLUMNS = ("alert_id, source, severity, description, status, timestamp, ts_epoch, id, row_version, "
+                 "sla_deadline, sla_deadline - CAST(strftime('%s', 'now') AS INTEGER)")
+STREAM_POLL_SECONDS = 1
+STREAM_KEEPALIVE_SECONDS = 15
+
+def alerts_version(cur):
+    cur.execute("SELECT version FROM alerts_version WHERE id = 1")
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+def alert_to_json(r):
+    sla_val, sla_col = format_sla(r[10])
+    return {
+        "id": r[0], "source": r[1], "severity": r[2],
+        "desc": r[3], "status": r[4], "time": r[5],
+        "ts_epoch": r[6], "seq": r[7],
+        "sla_remaining": sla_val, "sla_color": sla_col,
+        "sla_deadline": r[9],
+        "version": r[8]
+    }
+
+def changed_alerts(cur, since, limit):
+    cur.execute(f"SELECT {ALERT_COLUMNS} FROM alerts WHERE row_version > ? ORDER BY row_version LIMIT ?",
+                (since, limit))
+    return cur.fetchall()
+
+def alert_filters(args):
+    """WHERE clauses for the status/severity/source lists and since/until epochs; ValueError if malformed."""
+    clauses, params = [], []
+    for col in ("status", "severity", "source"):
+        values = [v for v in args.get(col, "").split(",") if v]
+        if values:
+            clauses.append(f"{col} IN ({','.join('?' * len(values))})")
+            params += values
+    for name, op in (("since", ">="), ("until", "<")):
+        if args.get(name):
+            clauses.append(f"ts_epoch {op} ?"); params.append(int(args[name]))
+    return clauses, params
+
 @app.route("/api/alerts", methods=["GET"])
 def fetch_alerts():
+    """Newest-first page of alerts.
+
+    Query params: limit, cursor (from the X-Next-Cursor header of the previous
+    page), status, severity, source (comma-separated lists) and since/until
+    (epoch seconds). Responses carry an ETag tied to the alerts write counter,
+    so an unchanged poll is answered 304 without touching the alerts table.
+    """
+    try:
+        limit = max(1, min(int(request.args.get("limit", ALERTS_PAGE_DEFAULT)), ALERTS_PAGE_MAX))
+        clauses, params = alert_filters(request.args)
+        cursor = request.args.get("cursor")
+        cursor_epoch, cursor_id = map(int, cursor.split(":")) if cursor else (None, None)
+    except ValueError:
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+
     conn = get_db()
     cur = conn.cursor()
-    cur.execute("SELECT alert_id, source, severity, description, status, timestamp FROM alerts ORDER BY timestamp DESC")
+    version = alerts_version(cur)
+    etag = f"{version}-{zlib.crc32(request.query_string):x}"
+    if request.if_none_match.contains(etag):
+        conn.close()
+        return "", 304, {"ETag": f'"{etag}"', "X-Alerts-Version": str(version)}
+
+    if cursor:
+        clauses.append("(ts_epoch < ? OR (ts_epoch = ? AND id < ?))")
+        params += [cursor_epoch, cursor_epoch, cursor_id]
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    cur.execute(f"""
+        SELECT {ALERT_COLUMNS}
+        FROM alerts {where} ORDER BY ts_epoch DESC, id DESC LIMIT ?
+    """, params + [limit])
     rows = cur.fetchall()
     conn.close()
-    results = []
-    for r in rows:
-        sla_val, sla_col = calculate_sla_remaining(r[5], r[2])
-        results.append({
-            "id": r[0], "source": r[1], "severity": r[2],
-            "desc": r[3], "status": r[4], "time": r[5],
-            "sla_remaining": sla_val, "sla_color": sla_col
-        })
-    return jsonify(results)
+    response = jsonify([alert_to_json(r) for r in rows])
+    response.set_etag(etag)
+    response.headers["X-Alerts-Version"] = str(version)
+    if rows and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = f"{rows[-1][6]}:{rows[-1][7]}"
+    return response
 
+@app.route("/api/alerts/changes", methods=["GET"])
+def fetch_alert_changes():
+    """Alerts inserted or updated after `since` (the X-Alerts-Version a client last saw).
 
+    Returns {"version", "alerts", "more"}; pass "version" back as `since` next
+    time. When "more" is true there are further changes to fetch right away.
+    """
+    since = request.args.get("since", 0, type=int)
+    limit = max(1, min(request.args.get("limit", ALERTS_PAGE_MAX, type=int), ALERTS_PAGE_MAX))
+    conn = get_db()
+    cur = conn.cursor()
+    version = alerts_version(cur)
+    rows = changed_alerts(cur, since, limit) if version > since else []
+    conn.close()
+    more = len(rows) == limit
+    return jsonify({
+        "version": rows[-1][8] if more else max(version, since),
+        "alerts": [alert_to_json(r) for r in rows],
+        "more": more
+    })
 
-@app.route("/api/alerts/<id>/report/download", methods=["GET"])
-def download_report(id):
+@app.route("/api/alerts/stream", methods=["GET"])
+def stream_alert_changes():
+    """Server-Sent Events version of /api/alerts/changes.
+
+    Each event carries a batch of changed alerts and its id is the version to
+    resume from, so EventSource reconnects pick up where they left off via
+    Last-Event-ID. The per-connection poll only reads the alerts_version row
+    until something actually changes.
+    """
+    # Malformed ids parse like a malformed `since`: start from the beginning
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", 0, type=int)
+
+    def events(since):
+        conn = get_db()
+        seen, idle = None, 0
+        try:
+            while True:
+                cur = conn.cursor()
+                version = alerts_version(cur)
+                if version != seen:
+                    rows = changed_alerts(cur, since, ALERTS_PAGE_MAX)
+                    if rows:
+                        since = rows[-1][8]
+                        yield f"id: {since}\ndata: {json.dumps([alert_to_json(r) for r in rows])}\n\n"
+                        idle = 0
+                        continue
+                    seen = version
+                idle += STREAM_POLL_SECONDS
+                if idle >= STREAM_KEEPALIVE_SECONDS:
+                    yield ": keepalive\n\n"
+                    idle = 0
+                time.sleep(STREAM_POLL_SECONDS)
+        finally:
+            conn.close()
+
+    return Response(events(since), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# --- FORENSIC REPORTS ---
+REPORT_FORMATS = {
+    "txt": ("text/plain", "txt"),
+    "json": ("application/json", "json"),
+    "csv": ("text/csv", "csv"),
+    "html": ("text/html", "html"),
+}
+REPORT_FETCH_ROWS = 500  # timeline rows pulled per fetchmany while streaming
+REPORT_EXPORT_MAX = 5000  # incidents per bulk export
+REPORT_ANALYST = "ANALYST_01"
+RULE = "=" * 60
+THIN_RULE = "-" * 60
+
+def incident_events(cur, incident_id):
+    """Yields (timestamp, description) for an incident in order, walking idx_timeline_incident."""
+    cur.execute("SELECT timestamp, description FROM timeline WHERE incident_id = ? ORDER BY id", (incident_id,))
+    while True:
+        rows = cur.fetchmany(REPORT_FETCH_ROWS)
+        if not rows:
+            return
+        yield from rows
+
+def report_txt(incident_id, events, report_date):
     """Generates a clean, professional forensic report for the analyst."""
-    report_content = f"""
-============================================================
+    yield f"""
+{RULE}
            CYBER-SOC V2.0 OFFICIAL INCIDENT REPORT          
-============================================================
-INCIDENT ID: {id}
-REPORT DATE: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-ANALYST: ANALYST_01
-============================================================
+{RULE}
+INCIDENT ID: {incident_id}
+REPORT DATE: {report_date}
+ANALYST: {REPORT_ANALYST}
+{RULE}
 
 1. FORENSIC TIMELINE & AUDIT TRAIL
-------------------------------------------------------------
+{THIN_RULE}
 """
     found = False
-    if os.path.exists(TIMELINE_PATH):
-        with open(TIMELINE_PATH, 'r') as f:
-            for line in f.readlines():
-                if id in line:
-                    # Clean up the line for the report
-                    report_content += f"[*] {line.strip()}\n"
-                    found = True
-    
+    for ts, desc in events:
+        found = True
+        yield f"[*] {ts}, {incident_id}, {desc}\n"
     if not found:
-        report_content += "[!] No forensic events recorded for this ID.\n"
-
-    report_content += f"""
-------------------------------------------------------------
+        yield "[!] No forensic events recorded for this ID.\n"
+    yield f"""
+{THIN_RULE}
 2. SYSTEM CLASSIFICATION
-------------------------------------------------------------
+{THIN_RULE}
 REPORT STATUS: VERIFIED
-DATA SOURCE: {TIMELINE_PATH}
-============================================================
+DATA SOURCE: {DB_PATH} (timeline)
+{RULE}
                    END OF OFFICIAL RECORD                   
-============================================================
+{RULE}
 """
-    
-    # Create the file in memory
-    mem = io.BytesIO()
-    mem.write(report_content.encode('utf-8'))
-    mem.seek(0)
-    
-    return send_file(
-        mem,
-        as_attachment=True,
-        download_name=f"SOC_Report_{id}.txt",
-        mimetype='text/plain'
-    )
+
+def report_json(incident_id, events, report_date):
+    head = json.dumps({"incident_id": incident_id, "report_date": report_date,
+                       "analyst": REPORT_ANALYST, "data_source": f"{DB_PATH} (timeline)"})
+    yield head[:-1] + ', "events": ['
+    sep = ""
+    for ts, desc in events:
+        yield sep + json.dumps({"timestamp": ts, "description": desc})
+        sep = ", "
+    yield "]}\n"
+
+def report_csv(incident_id, events, report_date):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["incident_id", "timestamp", "description"])
+    for ts, desc in events:
+        writer.writerow([incident_id, ts, desc])
+        if buf.tell() > 64 * 1024:
+            yield buf.getvalue()
+            buf.seek(0); buf.truncate()
+    yield buf.getvalue()
+
+def report_html(incident_id, events, report_date):
+    ref = html.escape(incident_id)
+    yield f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>SOC Report {ref}</title></head>
+<body>
+<h1>CYBER-SOC V2.0 Official Incident Report</h1>
+<p>Incident ID: {ref}<br>Report date: {report_date}<br>Analyst: {REPORT_ANALYST}</p>
+<h2>1. Forensic Timeline &amp; Audit Trail</h2>
+<table border="1" cellpadding="4">
+<tr><th>Timestamp</th><th>Description</th></tr>
+"""
+    for ts, desc in events:
+        yield f"<tr><td>{html.escape(str(ts))}</td><td>{html.escape(str(desc))}</td></tr>\n"
+    yield f"""</table>
+<h2>2. System Classification</h2>
+<p>Report status: VERIFIED<br>Data source: {html.escape(DB_PATH)} (timeline)</p>
+</body></html>
+"""
+
+REPORT_WRITERS = {"txt": report_txt, "json": report_json, "csv": report_csv, "html": report_html}
+
+def report_format():
+    fmt = request.args.get("format", "txt").lower()
+    return fmt if fmt in REPORT_FORMATS else None
+
+@app.route("/api/alerts/<id>/report/download", methods=["GET"])
+def download_report(id):
+    """Streams one incident's report as txt (default), json, csv or html (?format=)."""
+    fmt = report_format()
+    if not fmt:
+        return jsonify({"error": f"Unknown format; use one of {', '.join(REPORT_FORMATS)}"}), 400
+    # The id ends up in the attachment filename
+    if not INCIDENT_REF.fullmatch(id):
+        return jsonify({"error": "Invalid incident id"}), 400
+    mimetype, ext = REPORT_FORMATS[fmt]
+
+    def generate():
+        conn = get_db()
+        try:
+            report_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            for chunk in REPORT_WRITERS[fmt](id, incident_events(conn.cursor(), id), report_date):
+                yield chunk
+        finally:
+            conn.close()
+
+    return Response(generate(), mimetype=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="SOC_Report_{id}.{ext}"'})
+
+class ZipStream:
+    """Write-only file object zipfile can stream into; take() hands back what was written so far."""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+@app.route("/api/reports/export", methods=["GET"])
+def export_reports():
+    """Streams a zip with one report per incident.
+
+    Incidents come from `ids` (comma-separated) or else the /api/alerts
+    filters (status, severity, source, since, until), newest first, capped
+    at REPORT_EXPORT_MAX. Each report is compressed and sent as it is
+    generated, so memory use does not grow with the number of incidents.
+    """
+    fmt = report_format()
+    if not fmt:
+        return jsonify({"error": f"Unknown format; use one of {', '.join(REPORT_FORMATS)}"}), 400
+    ext = REPORT_FORMATS[fmt][1]
+    ids = [i for i in request.args.get("ids", "").split(",") if i]
+    # ids become zip member names, so nothing path-like gets through
+    if not all(INCIDENT_REF.fullmatch(i) for i in ids):
+        return jsonify({"error": "Invalid incident id"}), 400
+    try:
+        clauses, params = alert_filters(request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid filter parameters"}), 400
+
+    def generate():
+        conn = get_db()
+        try:
+            cur = conn.cursor()
+            if ids:
+                incidents = ids[:REPORT_EXPORT_MAX]
+            else:
+                where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+                cur.execute(f"SELECT alert_id FROM alerts {where} ORDER BY ts_epoch DESC, id DESC LIMIT ?",
+                            params + [REPORT_EXPORT_MAX])
+                incidents = [row[0] for row in cur.fetchall()]
+            report_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            out = ZipStream()
+            with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+                for incident_id in incidents:
+                    with zf.open(f"SOC_Report_{incident_id}.{ext}", "w", force_zip64=True) as member:
+                        for chunk in REPORT_WRITERS[fmt](incident_id, incident_events(cur, incident_id), report_date):
+                            member.write(chunk.encode("utf-8"))
+                    yield out.take()
+            yield out.take()
+        finally:
+            conn.close()
+
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return Response(generate(), mimetype="application/zip",
+                    headers={"Content-Disposition": f'attachment; filename="SOC_Reports_{stamp}.zip"'})
 
 @app.route("/api/alerts/<id>/state", methods=["POST"])
 def update_state(id):
@@ -128,58 +475,217 @@ def update_state(id):
     data = request.json
     next_state = data.get("state")
     note = data.get("note") # Carefully added to catch the note from frontend
+    analyst = data.get("analyst", "ANALYST_01")
     
     conn = get_db()
     cur = conn.cursor()
     
     # Update status only if state is provided
+    changed = False
     if next_state:
-        cur.execute("UPDATE alerts SET status=? WHERE alert_id=?", (next_state, id))
+        cur.execute("UPDATE alerts SET status=? WHERE alert_id=? AND status IS NOT ?", (next_state, id, next_state))
+        changed = cur.rowcount > 0
     
-    # PERMANENT FORENSIC RECORD
-    with open(TIMELINE_PATH, 'a') as f:
-        log_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        if note:
-            # Added logic to write the investigation note to your CSV
-            f.write(f"{log_time}, {id}, INVESTIGATION NOTE: {note}\n")
-        elif next_state:
-            f.write(f"{log_time}, {id}, Analyst transitioned state to {next_state}\n")
+    # PERMANENT FORENSIC RECORD: transition and note, alert_notes and timeline commit together
+    entries = []
+    if changed:
+        entries.append((next_state, "TRANSITION", f"Analyst transitioned state to {next_state}"))
+    if note:
+        entries.append((note, "NOTE", f"INVESTIGATION NOTE: {note}"))
+    created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for text, kind, entry in entries:
+        cur.execute("""
+            INSERT INTO alert_notes (alert_id, analyst, note, created_at, kind)
+            VALUES (?, ?, ?, ?, ?)
+        """, (id, analyst, text, created_at, kind))
+        record_timeline(cur, id, entry, "ANALYST")
         
     conn.commit()
     conn.close()
+    if changed:
+        escalation_wakeup.set()
     return jsonify({"success": True})
 
+@app.route("/api/alerts/<id>/notes", methods=["GET"])
+def get_notes(id):
+    """Investigation notes and state transitions for one alert, oldest first."""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT analyst, note, created_at, kind FROM alert_notes WHERE alert_id = ? ORDER BY id", (id,))
+    notes = [{"analyst": a, "note": n, "created_at": c, "kind": k} for a, n, c, k in cur.fetchall()]
+    conn.close()
+    return jsonify(notes)
+
 # --- SOC ANALYTICS ---
 @app.route("/api/soc/metrics")
 def soc_metrics():
-    return jsonify({"total_alerts": 197, "mttr_days": 0.5, "sla_breach_rate_percent": 2})
+    """SOC KPIs read from the trigger-maintained rollups (see schema.install_triggers and schema.rebuild_rollups)."""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT dimension, value, count FROM alert_counts WHERE count != 0")
+    counts = {"severity": {}, "status": {}}
+    for dimension, value, count in cur.fetchall():
+        counts[dimension][value] = count
+    cur.execute("SELECT ack_count, ack_seconds, resolve_count, resolve_seconds, breached FROM alert_durations WHERE id = 1")
+    ack_count, ack_seconds, resolve_count, resolve_seconds, breached = cur.fetchone() or (0, 0, 0, 0, 0)
+    conn.close()
+
+    total = sum(counts["severity"].values())
+    mtta = ack_seconds / ack_count if ack_count else 0
+    mttr = resolve_seconds / resolve_count if resolve_count else 0
+    return jsonify({
+        "total_alerts": total,
+        "by_severity": counts["severity"],
+        "by_status": counts["status"],
+        "mtta_minutes": round(mtta / 60, 1),
+        "mttr_minutes": round(mttr / 60, 1),
+        "mttr_days": round(mttr / 86400, 2),
+        "sla_breached": breached,
+        "sla_breach_rate_percent": round(100 * breached / total, 1) if total else 0
+    })
+
+# --- SYSTEM HEALTH COLLECTOR ---
+HEALTH_SAMPLE_SECONDS = 5
+LAG_WARN_BYTES = 10 * 1024 * 1024  # unread log backlog that marks the pipeline as behind
+STARTED_AT = time.time()
+health_snapshot = {"status": "Starting"}
+escalation_heartbeat = 0.0  # last time auto_escalate_worker finished a pass
+
+def read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def correlator_lag():
+    """Bytes each log file holds beyond correlate.py's last checkpoint (see ingest_state.json)."""
+    checkpoints = read_json(INGEST_STATE_PATH, {}).get("files", {})
+    lag = {}
+    if not os.path.isdir(LOGS_DIR):
+        return lag
+    for name in sorted(os.listdir(LOGS_DIR)):
+        if not name.endswith(".log"):
+            continue
+        st = os.stat(os.path.join(LOGS_DIR, name))
+        cp = checkpoints.get(name, {})
+        offset = cp.get("offset", 0) if cp.get("inode") == st.st_ino else 0
+        lag[name] = max(0, st.st_size - offset)
+    return lag
+
+def sample_health(proc):
+    """One health sample: a few stat() calls and psutil counters, no DB queries."""
+    lag = correlator_lag()
+    run = read_json(RUN_STATS_PATH, {})
+    heartbeat_age = time.time() - escalation_heartbeat if escalation_heartbeat else None
+    escalation_ok = heartbeat_age is not None and heartbeat_age < 3 * ESCALATION_MAX_SLEEP
+    db_bytes = sum(os.path.getsize(DB_PATH + ext) for ext in ("", "-wal") if os.path.exists(DB_PATH + ext))
+    behind = sum(lag.values()) > LAG_WARN_BYTES
+    return {
+        "os": f"{platform.system()} {platform.release()}",
+        "uptime_hours": round((time.time() - STARTED_AT) / 3600, 2),
+        "rss_mb": round(proc.memory_info().rss / 2**20, 1),
+        "cpu_percent": proc.cpu_percent(None),
+        "db_size_mb": round(db_bytes / 2**20, 2),
+        "correlator_lag_bytes": lag,
+        "correlator_lag_total": sum(lag.values()),
+        "last_correlation": run,
+        "alerts_per_sec": run.get("alerts_per_sec", 0),
+        "escalation_heartbeat_age": round(heartbeat_age, 1) if heartbeat_age is not None else None,
+        "status": "Healthy" if escalation_ok and not behind else "Degraded",
+        "sampled_at": int(time.time())
+    }
+
+def health_collector():
+    """Refreshes health_snapshot every HEALTH_SAMPLE_SECONDS so requests only read a dict."""
+    global health_snapshot
+    proc = psutil.Process()
+    proc.cpu_percent(None)  # primes the counter; later calls report usage since the previous one
+    while True:
+        try:
+            health_snapshot = sample_health(proc)
+        except Exception as e:
+            print(f"⚠️ Health sampling error: {e}")
+        time.sleep(HEALTH_SAMPLE_SECONDS)
 
 @app.route("/api/system_health")
 def system_health():
-    return jsonify({"os": "Kali Linux", "uptime_hours": 24.5, "status": "Healthy"})
+    return jsonify(health_snapshot)
 
 # --- AUTO-ESCALATION ENGINE ---
+ESCALATION_MAX_SLEEP = 10  # seconds; bounds how long a new alert from correlate.py goes unseen
+escalation_wakeup = threading.Event()
+# Mirrors the status trigger, which stamps acknowledged_at on ACKNOWLEDGED/CLOSED
+UNACKNOWLEDGED = "acknowledged_at IS NULL AND status NOT IN ('ACKNOWLEDGED', 'CLOSED')"
+
+def load_escalation_changes(cur, since, heap, current):
+    """Pulls alerts changed after `since` into the deadline heap; returns the new cursor.
+
+    `current` maps alert_id -> row_version of the entry that is still valid;
+    heap entries with an older version are dropped when they surface.
+    """
+    cur.execute("""
+        SELECT alert_id, status, acknowledged_at, sla_deadline, row_version
+        FROM alerts WHERE row_version > ? ORDER BY row_version
+    """, (since,))
+    for aid, status, acknowledged_at, deadline, version in cur.fetchall():
+        since = version
+        current.pop(aid, None)
+        # Acknowledged alerts have met (or, if late, already been charged by the ack trigger) their SLA
+        if acknowledged_at is not None or status in ('ACKNOWLEDGED', 'CLOSED') or deadline is None:
+            continue
+        current[aid] = version
+        heapq.heappush(heap, (deadline, aid, version))
+    return since
+
+def escalate_due(cur, heap, current, now):
+    """Marks alerts whose deadline passed unacknowledged as breached; non-HIGH ones are escalated to HIGH."""
+    while heap and heap[0][0] <= now:
+        _, aid, row_version = heapq.heappop(heap)
+        if current.get(aid) != row_version:
+            continue
+        del current[aid]
+        cur.execute(f"UPDATE alerts SET sla_breached=1 WHERE alert_id=? AND {UNACKNOWLEDGED} AND COALESCE(sla_breached, 0) = 0", (aid,))
+        breached = cur.rowcount
+        cur.execute(f"UPDATE alerts SET severity='HIGH' WHERE alert_id=? AND severity != 'HIGH' AND {UNACKNOWLEDGED}", (aid,))
+        if cur.rowcount:
+            record_timeline(cur, aid, "SYSTEM: SLA Breached - Auto-Escalated to HIGH", "SYSTEM")
+        elif breached:
+            record_timeline(cur, aid, "SYSTEM: SLA Breached", "SYSTEM")
+
 def auto_escalate_worker():
+    """Sleeps until the earliest pending SLA deadline and escalates only what breached.
+
+    Each wake-up reads the alerts_version counter; only when it moved are the
+    changed rows (by row_version) folded into the heap, so idle cost does not
+    grow with the number of open alerts.
+    """
+    global escalation_heartbeat
+    heap, current = [], {}
+    since, seen_version = -1, None
     while True:
         try:
             conn = get_db()
             cur = conn.cursor()
-            cur.execute("SELECT alert_id, severity, timestamp FROM alerts WHERE status != 'CLOSED'")
-            for aid, sev, ts in cur.fetchall():
-                limit = SLA_POLICY.get(sev, 60)
-                deadline = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S") + timedelta(minutes=limit)
-                if datetime.now() > deadline and sev != "HIGH":
-                    cur.execute("UPDATE alerts SET severity='HIGH' WHERE alert_id=?", (aid,))
-                    with open(TIMELINE_PATH, 'a') as f:
-                        f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}, {aid}, SYSTEM: SLA Breached - Auto-Escalated to HIGH\n")
+            version = alerts_version(cur)
+            if version != seen_version:
+                since = load_escalation_changes(cur, since, heap, current)
+                seen_version = version
+            escalate_due(cur, heap, current, time.time())
             conn.commit()
             conn.close()
-        except: pass
-        time.sleep(30)
+            escalation_heartbeat = time.time()
+        except Exception as e:
+            print(f"⚠️ Auto-escalation error: {e}")
+        next_deadline = heap[0][0] - time.time() if heap else ESCALATION_MAX_SLEEP
+        escalation_wakeup.wait(max(0, min(next_deadline, ESCALATION_MAX_SLEEP)))
+        escalation_wakeup.clear()
 
 if __name__ == "__main__":
-    init_db()
+    init_db(TIMELINE_PATH)
     threading.Thread(target=auto_escalate_worker, daemon=True).start()
+    threading.Thread(target=health_collector, daemon=True).start()
+    threading.Thread(target=timeline_exporter, daemon=True).start()
     correlate_script = os.path.join(ROOT_DIR, 'scripts', 'correlate.py')
     if os.path.exists(correlate_script):
         subprocess.run(["python3", correlate_script])
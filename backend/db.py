@@ -1,25 +1,74 @@
+import os
+import sys
 import sqlite3
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from schema import migrate, refresh_derived
 
 DB_PATH = "soc.db"
 
+POOL_SIZE = 8  # idle connections kept open for reuse
+BUSY_TIMEOUT = 10  # seconds a writer waits on a lock before "database is locked"
+STATEMENT_CACHE = 256  # prepared statements kept per connection
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",  # readers no longer block on the escalation/correlate writers
+    "PRAGMA synchronous=NORMAL",  # fsync on checkpoint only; safe with WAL
+    "PRAGMA cache_size=-16000",  # 16 MB page cache
+    "PRAGMA mmap_size=268435456",  # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+)
+
+class PooledConnection(sqlite3.Connection):
+    """Connection whose close() hands it back to the pool instead of closing it."""
+    def close(self):
+        release_db(self)
+
+_pool = []
+_pool_lock = threading.Lock()
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE, factory=PooledConnection)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
 def get_db():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
+    """Checks out a configured connection; callers still just close() it when done.
 
-def init_db():
-    conn = get_db()
-    cur = conn.cursor()
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS alerts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        alert_id TEXT,
-        source TEXT,
-        severity TEXT,
-        description TEXT,
-        status TEXT,
-        timestamp TEXT
-    )
-    """)
+    Connections are reused across requests, so their pragmas and prepared
+    statement caches survive, and a connection is only ever used by the
+    thread that checked it out.
+    """
+    with _pool_lock:
+        if _pool:
+            return _pool.pop()
+    return _connect()
+
+def release_db(conn):
+    """Returns a connection to the pool, discarding any uncommitted work."""
+    if conn.in_transaction:
+        conn.rollback()
+    with _pool_lock:
+        if len(_pool) < POOL_SIZE:
+            _pool.append(conn)
+            return
+    sqlite3.Connection.close(conn)
 
+def close_pool():
+    """Really closes every idle connection (e.g. after DB_PATH changes)."""
+    with _pool_lock:
+        idle = _pool[:]
+        del _pool[:]
+    for conn in idle:
+        sqlite3.Connection.close(conn)
+
+def init_db(timeline_csv=None):
+    """Migrates soc.db to the shared schema and refreshes SLA-dependent triggers and data."""
+    conn = get_db()
+    # Also imports a legacy timeline.csv once (see schema.adopt_timeline_csv)
+    migrate(conn, timeline_csv)
+    refresh_derived(conn.cursor())
     conn.commit()
     conn.close()
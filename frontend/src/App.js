@@ -1,6 +1,8 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { ShieldAlert, Clock, Activity, History, CheckCircle, Search, X, FileText, User, Terminal, Send } from 'lucide-react';
 
+const ALERTS_PAGE = 200;
+
 const App = () => {
   const [alerts, setAlerts] = useState([]);
   const [metrics, setMetrics] = useState({ total_alerts: 0, mttr_days: 0, sla_breach_rate_percent: 0 });
@@ -12,14 +14,19 @@ const App = () => {
   // Investigation notes state
   const [noteInput, setNoteInput] = useState("");
 
+  // SLA countdowns tick locally from sla_deadline, so a 304 poll still shows live timers
+  const [now, setNow] = useState(Date.now() / 1000);
+  useEffect(() => {
+    const tick = setInterval(() => setNow(Date.now() / 1000), 1000);
+    return () => clearInterval(tick);
+  }, []);
+
   const fetchAllData = useCallback(async () => {
     try {
-      const [aRes, mRes, hRes] = await Promise.all([
-        fetch('http://127.0.0.1:5000/api/alerts').then(res => res.json()),
+      const [mRes, hRes] = await Promise.all([
         fetch('http://127.0.0.1:5000/api/soc/metrics').then(res => res.json()),
         fetch('http://127.0.0.1:5000/api/system_health').then(res => res.json())
       ]);
-      setAlerts(aRes);
       setMetrics(mRes);
       setHealth(hRes);
     } catch (err) {
@@ -27,6 +34,46 @@ const App = () => {
     }
   }, []);
 
+  // Alerts: one full page, then only inserted/updated rows from the change stream
+  useEffect(() => {
+    let source;
+    // Same order as /api/alerts: newest ts_epoch first, row id breaking ties
+    const newerFirst = (a, b) => (b.ts_epoch - a.ts_epoch) || (b.seq - a.seq);
+    const applyChanges = (changed) => setAlerts(prev => {
+      const byId = new Map(prev.map(a => [a.id, a]));
+      // A full page stops at its oldest row; changes to older alerts (e.g. an
+      // SLA escalation) belong to pages that were never loaded
+      const oldest = prev.length >= ALERTS_PAGE ? prev[prev.length - 1] : null;
+      changed.forEach(a => {
+        if (byId.has(a.id) || !oldest || newerFirst(a, oldest) < 0) byId.set(a.id, a);
+      });
+      return [...byId.values()].sort(newerFirst);
+    });
+    let retry, cancelled = false;
+    // The backend only starts serving once its startup correlation run is done,
+    // so keep retrying the first page every 5s and open the stream after it loads
+    const loadAlerts = () => fetch(`http://127.0.0.1:5000/api/alerts?limit=${ALERTS_PAGE}`)
+      .then(async res => {
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        const page = await res.json();
+        if (cancelled) return;
+        setAlerts(page);
+        const since = res.headers.get('X-Alerts-Version') || 0;
+        source = new EventSource(`http://127.0.0.1:5000/api/alerts/stream?since=${since}`);
+        source.onmessage = (e) => applyChanges(JSON.parse(e.data));
+      })
+      .catch(() => {
+        console.error("SOC Backend Unreachable");
+        if (!cancelled) retry = setTimeout(loadAlerts, 5000);
+      });
+    loadAlerts();
+    return () => {
+      cancelled = true;
+      clearTimeout(retry);
+      if (source) source.close();
+    };
+  }, []);
+
   useEffect(() => {
     fetchAllData();
     const interval = setInterval(fetchAllData, 5000); 
@@ -60,9 +107,8 @@ const App = () => {
       });
       setNoteInput(""); 
       // Refresh timeline to show the new note
-      const res = await fetch('http://127.0.0.1:5000/api/timeline');
-      const data = await res.json();
-      setTimeline(data.filter(e => e.id === selectedIncident.id));
+      const res = await fetch(`http://127.0.0.1:5000/api/timeline?incident_id=${encodeURIComponent(selectedIncident.id)}`);
+      setTimeline(await res.json());
     } catch (err) {
       console.error("Failed to save note");
     }
@@ -71,9 +117,8 @@ const App = () => {
   const openForensics = async (incident) => {
     setSelectedIncident(incident);
     try {
-      const res = await fetch('http://127.0.0.1:5000/api/timeline');
-      const data = await res.json();
-      setTimeline(data.filter(e => e.id === incident.id));
+      const res = await fetch(`http://127.0.0.1:5000/api/timeline?incident_id=${encodeURIComponent(incident.id)}`);
+      setTimeline(await res.json());
     } catch (err) {
       setTimeline([]);
     }
@@ -157,8 +202,8 @@ const App = () => {
                     {alert.severity}
                   </span>
                 </td>
-                <td className={`p-5 font-mono font-bold ${alert.sla_color === 'red' ? 'text-red-500 animate-pulse' : 'text-emerald-400'}`}>
-                  {alert.sla_remaining}
+                <td className={`p-5 font-mono font-bold ${slaView(alert, now).color === 'red' ? 'text-red-500 animate-pulse' : 'text-emerald-400'}`}>
+                  {slaView(alert, now).text}
                 </td>
                 <td className="p-5">
                     <div className="flex items-center gap-2">
@@ -276,6 +321,13 @@ const App = () => {
   );
 };
 
+const slaView = (alert, now) => {
+  if (!alert.sla_deadline) return { text: alert.sla_remaining, color: alert.sla_color };
+  const seconds = Math.floor(alert.sla_deadline - now);
+  if (seconds < 0) return { text: "EXPIRED", color: "red" };
+  return { text: `${Math.floor(seconds / 60)}m ${seconds % 60}s`, color: "green" };
+};
+
 const StatusPill = ({ title, value, color }) => (
   <div className="bg-slate-900/50 border border-slate-800 px-5 py-2 rounded-xl shadow-lg flex flex-col items-center min-w-[100px]">
     <span className="text-[8px] text-slate-500 uppercase font-black tracking-widest mb-1">{title}</span>
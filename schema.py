@@ -0,0 +1,383 @@
+"""Single source of truth for the soc.db schema.
+
+backend/db.py, the root db.py and scripts/correlate.py all call migrate() on
+the connection they open, so whichever entry point creates soc.db first, it
+ends up with the same tables, triggers and indexes. Applied migrations are
+recorded in PRAGMA user_version.
+"""
+import os
+import re
+from functools import lru_cache
+from datetime import datetime, timedelta
+
+SLA_POLICY = {"HIGH": 15, "MEDIUM": 60, "LOW": 240}  # minutes to acknowledge, by severity
+NOW_SQL = "CAST(strftime('%s', 'now') AS INTEGER)"
+INCIDENT_REF = re.compile(r"^(INC|ALERT)-[A-Za-z0-9_-]+$")
+
+# Indexes the hot queries rely on; check_indexes() recreates any that go missing
+INDEXES = {
+    # ON CONFLICT dedup key for correlate.py
+    "idx_alerts_dedup": "CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_dedup ON alerts (description, timestamp)",
+    # state changes, report downloads and escalations look alerts up by alert_id
+    "idx_alerts_alert_id": "CREATE INDEX IF NOT EXISTS idx_alerts_alert_id ON alerts (alert_id)",
+    # /api/alerts ordering, filters and keyset cursor
+    "idx_alerts_time": "CREATE INDEX IF NOT EXISTS idx_alerts_time ON alerts (ts_epoch, id)",
+    "idx_alerts_status_time": "CREATE INDEX IF NOT EXISTS idx_alerts_status_time ON alerts (status, ts_epoch, id)",
+    "idx_alerts_severity_time": "CREATE INDEX IF NOT EXISTS idx_alerts_severity_time ON alerts (severity, ts_epoch, id)",
+    "idx_alerts_source_time": "CREATE INDEX IF NOT EXISTS idx_alerts_source_time ON alerts (source, ts_epoch, id)",
+    # /api/alerts/changes feed and the escalation worker
+    "idx_alerts_row_version": "CREATE INDEX IF NOT EXISTS idx_alerts_row_version ON alerts (row_version)",
+    "idx_timeline_incident": "CREATE INDEX IF NOT EXISTS idx_timeline_incident ON timeline (incident_id, id)",
+    "idx_timeline_time": "CREATE INDEX IF NOT EXISTS idx_timeline_time ON timeline (ts_epoch, id)",
+    "idx_alert_notes_alert": "CREATE INDEX IF NOT EXISTS idx_alert_notes_alert ON alert_notes (alert_id, id)",
+    # timeline.csv exporter: skips the LOG rows, so an idle pass costs the same however long the log history
+    "idx_timeline_export": "CREATE INDEX IF NOT EXISTS idx_timeline_export ON timeline (id) WHERE source != 'LOG'",
+}
+
+@lru_cache(maxsize=4096)
+def _second_to_epoch(second, tz):
+    """Epoch for one whole second; logs repeat the same second many times."""
+    if "T" in second:
+        return int(datetime.fromisoformat(second + tz).timestamp())
+    if second[:1].isdigit():
+        return int(datetime.strptime(second, "%Y-%m-%d %H:%M:%S").timestamp())
+    # Syslog has no year: assume this year unless that lands in the future
+    now = datetime.now()
+    dt = datetime.strptime(f"{now.year} {second}", "%Y %b %d %H:%M:%S")
+    if dt > now + timedelta(days=1): dt = dt.replace(year=now.year - 1)
+    return int(dt.timestamp())
+
+def to_epoch(ts):
+    """Normalises ISO-8601, syslog and 'YYYY-MM-DD HH:MM:SS' stamps to epoch seconds.
+
+    Returns None for anything unparseable.
+    """
+    try:
+        if ts[:1].isdigit() and "T" in ts[:11]:
+            # 2025-10-12T12:39:01.510674+05:30 -> ("2025-10-12T12:39:01", "+05:30")
+            return _second_to_epoch(ts[:19], ts[19:].lstrip(".0123456789"))
+        return _second_to_epoch(" ".join(ts.split()), "")
+    except (TypeError, ValueError):
+        return None
+
+def parse_epoch(ts):
+    """Best-effort epoch for rows written before ts_epoch existed; 0 sorts them last."""
+    return to_epoch(ts) or 0
+
+def sla_deadline_sql(row):
+    """SQL expression for a row's SLA deadline; NULL when its timestamp is unknown."""
+    minutes = " ".join(f"WHEN '{sev}' THEN {m}" for sev, m in SLA_POLICY.items())
+    return (f"CASE WHEN {row}.ts_epoch > 0 "
+            f"THEN {row}.ts_epoch + 60 * CASE {row}.severity {minutes} ELSE 60 END END")
+
+def bump_count(dimension, value, delta):
+    return f"""
+            INSERT INTO alert_counts (dimension, value, count) VALUES ('{dimension}', COALESCE({value}, 'UNKNOWN'), {delta})
+            ON CONFLICT (dimension, value) DO UPDATE SET count = count + {delta};"""
+
+def table_columns(cur, table):
+    return {row[1] for row in cur.execute(f"PRAGMA table_info({table})")}
+
+# ------------------------------
+# MIGRATIONS
+# ------------------------------
+def m1_tables(cur):
+    """Base tables, plus the columns either legacy db.py may be missing."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS alerts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        alert_id TEXT,
+        source TEXT,
+        severity TEXT,
+        description TEXT,
+        status TEXT DEFAULT 'OPEN',
+        timestamp TEXT
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS alert_notes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        alert_id TEXT,
+        analyst TEXT,
+        note TEXT,
+        created_at TEXT
+    )
+    """)
+    # Append-only forensic timeline
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS timeline (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts_epoch INTEGER,
+        timestamp TEXT,
+        incident_id TEXT,
+        description TEXT,
+        source TEXT
+    )
+    """)
+    columns = table_columns(cur, "alerts")
+    # ts_epoch: epoch seconds so readers never re-parse timestamp strings.
+    # row_version / sla_deadline: stamped by the triggers in m3.
+    # created_at ... sla_breached: feed the /api/soc/metrics rollups.
+    for name, decl in (("ts_epoch", "INTEGER"), ("row_version", "INTEGER"), ("sla_deadline", "INTEGER"),
+                       ("created_at", "INTEGER"), ("acknowledged_at", "INTEGER"), ("closed_at", "INTEGER"),
+                       ("sla_breached", "INTEGER DEFAULT 0")):
+        if name not in columns:
+            cur.execute(f"ALTER TABLE alerts ADD COLUMN {name} {decl}")
+    backfill_epochs(cur)
+
+def m2_indexes(cur):
+    create_indexes(cur, INDEXES)
+
+def m3_triggers(cur):
+    """Change-feed counter and metrics rollups, both maintained by triggers."""
+    # Single-row counter bumped by every write to alerts; the cheap ETag source
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS alerts_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    """)
+    cur.execute("INSERT OR IGNORE INTO alerts_version (id, version) VALUES (1, 0)")
+    cur.execute("UPDATE alerts SET row_version = 0 WHERE row_version IS NULL")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS alert_counts (
+        dimension TEXT NOT NULL,
+        value TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (dimension, value)
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS alert_durations (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        ack_count INTEGER NOT NULL,
+        ack_seconds INTEGER NOT NULL,
+        resolve_count INTEGER NOT NULL,
+        resolve_seconds INTEGER NOT NULL,
+        breached INTEGER NOT NULL
+    )
+    """)
+    refresh_derived(cur)
+
+def m4_notes(cur):
+    """alert_notes also records state transitions; export_cursors tracks the timeline.csv export."""
+    if "kind" not in table_columns(cur, "alert_notes"):
+        cur.execute("ALTER TABLE alert_notes ADD COLUMN kind TEXT DEFAULT 'NOTE'")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS export_cursors (
+        name TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL
+    )
+    """)
+
+def m5_export_index(cur):
+    create_indexes(cur, ["idx_timeline_export"])
+
+MIGRATIONS = [
+    (1, "tables and columns", m1_tables),
+    (2, "hot-query indexes", m2_indexes),
+    (3, "change feed and metrics triggers", m3_triggers),
+    (4, "notes, transitions and export cursors", m4_notes),
+    (5, "timeline export index", m5_export_index),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# ------------------------------
+# DERIVED DATA & TRIGGERS
+# ------------------------------
+def backfill_epochs(cur):
+    # ts_epoch = 0 also covers rows an older parse_epoch could not read (syslog stamps)
+    rows = cur.execute("SELECT id, timestamp FROM alerts WHERE ts_epoch IS NULL OR ts_epoch = 0").fetchall()
+    cur.executemany("UPDATE alerts SET ts_epoch=? WHERE id=?", [(parse_epoch(ts), row_id) for row_id, ts in rows])
+
+def create_indexes(cur, names):
+    if "idx_alerts_dedup" in names:
+        # Collapse rows the unique index would reject onto their earliest copy
+        cur.execute("""
+            DELETE FROM alerts WHERE id NOT IN
+                (SELECT MIN(id) FROM alerts GROUP BY description, timestamp)
+        """)
+    for name in names:
+        cur.execute(INDEXES[name])
+
+def install_triggers(cur):
+    """(Re)creates every trigger on alerts; they embed SLA_POLICY, so this runs on each backend start."""
+    data_columns = "alert_id, source, severity, description, status, timestamp, ts_epoch"
+    triggers = {}
+    # row_version and sla_deadline are not data columns, so stamping them does not re-fire the update trigger
+    for event, target in (("INSERT", "INSERT"), ("UPDATE", f"UPDATE OF {data_columns}")):
+        triggers[f"alerts_version_{event.lower()}"] = f"""AFTER {target} ON alerts
+        BEGIN
+            UPDATE alerts_version SET version = version + 1 WHERE id = 1;
+            UPDATE alerts SET row_version = (SELECT version FROM alerts_version WHERE id = 1),
+                              sla_deadline = {sla_deadline_sql('NEW')}
+            WHERE id = NEW.id;
+        END"""
+    triggers["alerts_version_delete"] = """AFTER DELETE ON alerts
+        BEGIN
+            UPDATE alerts_version SET version = version + 1 WHERE id = 1;
+        END"""
+    triggers.update({
+        "alerts_metrics_insert": f"""AFTER INSERT ON alerts
+        BEGIN{bump_count('severity', 'NEW.severity', 1)}{bump_count('status', 'NEW.status', 1)}
+            UPDATE alerts SET created_at = {NOW_SQL} WHERE id = NEW.id;
+        END""",
+        "alerts_metrics_delete": f"""AFTER DELETE ON alerts
+        BEGIN{bump_count('severity', 'OLD.severity', -1)}{bump_count('status', 'OLD.status', -1)}
+        END""",
+        "alerts_metrics_severity": f"""AFTER UPDATE OF severity ON alerts WHEN OLD.severity IS NOT NEW.severity
+        BEGIN{bump_count('severity', 'OLD.severity', -1)}{bump_count('severity', 'NEW.severity', 1)}
+        END""",
+        # Status transitions stamp acknowledged_at / closed_at exactly once
+        "alerts_metrics_status": f"""AFTER UPDATE OF status ON alerts WHEN OLD.status IS NOT NEW.status
+        BEGIN{bump_count('status', 'OLD.status', -1)}{bump_count('status', 'NEW.status', 1)}
+            UPDATE alerts SET acknowledged_at = {NOW_SQL}
+            WHERE id = NEW.id AND acknowledged_at IS NULL AND NEW.status IN ('ACKNOWLEDGED', 'CLOSED');
+            UPDATE alerts SET closed_at = {NOW_SQL}
+            WHERE id = NEW.id AND closed_at IS NULL AND NEW.status = 'CLOSED';
+        END""",
+        # Acknowledging after the deadline counts as an SLA breach
+        "alerts_metrics_ack": """AFTER UPDATE OF acknowledged_at ON alerts
+        WHEN OLD.acknowledged_at IS NULL AND NEW.acknowledged_at IS NOT NULL
+        BEGIN
+            UPDATE alert_durations SET ack_count = ack_count + 1,
+                                       ack_seconds = ack_seconds + (NEW.acknowledged_at - NEW.created_at)
+            WHERE id = 1 AND NEW.created_at IS NOT NULL;
+            UPDATE alerts SET sla_breached = 1 WHERE id = NEW.id AND NEW.acknowledged_at > NEW.sla_deadline;
+        END""",
+        "alerts_metrics_close": """AFTER UPDATE OF closed_at ON alerts
+        WHEN OLD.closed_at IS NULL AND NEW.closed_at IS NOT NULL
+        BEGIN
+            UPDATE alert_durations SET resolve_count = resolve_count + 1,
+                                       resolve_seconds = resolve_seconds + (NEW.closed_at - NEW.created_at)
+            WHERE id = 1 AND NEW.created_at IS NOT NULL;
+        END""",
+        "alerts_metrics_breach": """AFTER UPDATE OF sla_breached ON alerts
+        WHEN NEW.sla_breached = 1 AND COALESCE(OLD.sla_breached, 0) = 0
+        BEGIN
+            UPDATE alert_durations SET breached = breached + 1 WHERE id = 1;
+        END""",
+    })
+    for name, body in triggers.items():
+        cur.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cur.execute(f"CREATE TRIGGER {name} {body}")
+
+def rebuild_rollups(cur):
+    """Recomputes alert_counts/alert_durations (behind /api/soc/metrics) from the alert rows."""
+    cur.execute("DELETE FROM alert_counts")
+    for dimension in ("severity", "status"):
+        cur.execute(f"""
+            INSERT INTO alert_counts (dimension, value, count)
+            SELECT '{dimension}', COALESCE({dimension}, 'UNKNOWN'), COUNT(*) FROM alerts GROUP BY 2
+        """)
+    cur.execute("""
+        INSERT OR REPLACE INTO alert_durations
+        SELECT 1,
+               COUNT(acknowledged_at - created_at), COALESCE(SUM(acknowledged_at - created_at), 0),
+               COUNT(closed_at - created_at), COALESCE(SUM(closed_at - created_at), 0),
+               COALESCE(SUM(sla_breached), 0)
+        FROM alerts
+    """)
+
+def refresh_derived(cur):
+    """Re-derives everything that depends on SLA_POLICY or may have drifted: triggers, deadlines, rollups."""
+    backfill_epochs(cur)
+    cur.execute(f"UPDATE alerts SET sla_deadline = {sla_deadline_sql('alerts')}")
+    install_triggers(cur)
+    rebuild_rollups(cur)
+
+# ------------------------------
+# LEGACY timeline.csv
+# ------------------------------
+def timeline_row(line):
+    """Maps a legacy timeline.csv line to (ts_epoch, timestamp, incident_id, description, source).
+
+    Analyst/system lines are "ts, INC-..., text"; correlate lines are "ts,log message".
+    """
+    ts, _, rest = line.strip().partition(',')
+    ref, _, text = rest.partition(',')
+    if INCIDENT_REF.match(ref.strip()):
+        text = text.strip()
+        source = "SYSTEM" if text.startswith("SYSTEM:") else "ANALYST"
+        return parse_epoch(ts), ts, ref.strip(), text, source
+    return parse_epoch(ts), ts, None, rest, "LOG"
+
+def import_timeline_csv(cur, path):
+    """Moves the lines of a pre-table timeline.csv into the timeline table.
+
+    correlate.py may already have written its LOG rows by now, so each kind
+    of line is only imported while the table holds none of that kind.
+    """
+    have_log = cur.execute("SELECT 1 FROM timeline WHERE source = 'LOG' LIMIT 1").fetchone()
+    have_other = cur.execute("SELECT 1 FROM timeline WHERE source != 'LOG' LIMIT 1").fetchone()
+    with open(path, 'r', errors='ignore') as f:
+        rows = (timeline_row(line) for line in f if line.strip() and not line.startswith("Timestamp,"))
+        cur.executemany("""
+            INSERT INTO timeline (ts_epoch, timestamp, incident_id, description, source)
+            VALUES (?, ?, ?, ?, ?)
+        """, (row for row in rows if not (have_log if row[4] == "LOG" else have_other)))
+
+def adopt_timeline_csv(conn, path):
+    """One-time import of timeline.csv, marked by the exporter's 'timeline_csv' cursor.
+
+    Whichever entry point gets here first imports the file and starts the
+    cursor after everything then in the table, which the CSV already holds.
+    """
+    marker = "SELECT 1 FROM export_cursors WHERE name = 'timeline_csv'"
+    if conn.execute(marker).fetchone():
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if not conn.execute(marker).fetchone():
+            cur = conn.cursor()
+            if os.path.exists(path):
+                import_timeline_csv(cur, path)
+            cur.execute("""
+                INSERT INTO export_cursors (name, last_id)
+                SELECT 'timeline_csv', COALESCE(MAX(id), 0) FROM timeline
+            """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+# ------------------------------
+# ENTRY POINT
+# ------------------------------
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn, timeline_csv=None):
+    """Brings conn's database up to SCHEMA_VERSION, then checks the hot-query indexes.
+
+    Each migration runs in its own IMMEDIATE transaction and re-checks the
+    version under the lock, so two entry points starting together apply it once.
+    Entry points that know where timeline.csv lives pass it, so its legacy
+    lines are imported before either one writes to the table or the file.
+    """
+    for version, name, step in MIGRATIONS:
+        if schema_version(conn) >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) < version:
+                step(conn.cursor())
+                conn.execute(f"PRAGMA user_version = {version}")
+                print(f"🗄️ Schema migration {version} applied: {name}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    if timeline_csv:
+        adopt_timeline_csv(conn, timeline_csv)
+    check_indexes(conn)
+
+def check_indexes(conn):
+    """Startup check: recreates any hot-query index that has gone missing."""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    missing = [name for name in INDEXES if name not in existing]
+    if not missing:
+        return
+    print(f"⚠️ Missing indexes recreated: {', '.join(missing)}")
+    with conn:
+        create_indexes(conn.cursor(), missing)
@@ -10,7 +10,18 @@ from urllib.parse import urlparse
 def parse_eml(file_path):
     with open(file_path, 'rb') as f:
         msg = email.message_from_binary_file(f, policy=policy.default)
+    return parse_message(msg)
 
+def part_text(part):
+    # get_content() honours the charset but raises on unknown ones
+    try:
+        return part.get_content() or ''
+    except (LookupError, UnicodeError):
+        payload = part.get_payload(decode=True) or b''
+        return payload.decode(errors='ignore')
+
+def parse_message(msg):
+    """Headers, first text/plain and text/html bodies and attachments of a parsed message"""
     parsed = {
         'from': msg.get('From'),
         'to': msg.get('To'),
@@ -34,15 +45,15 @@ def parse_eml(file_path):
                     'content_type': ctype
                 })
             elif ctype == 'text/plain' and not parsed['body_text']:
-                parsed['body_text'] = part.get_content() or ''
+                parsed['body_text'] = part_text(part)
             elif ctype == 'text/html' and not parsed['body_html']:
-                parsed['body_html'] = part.get_content() or ''
+                parsed['body_html'] = part_text(part)
     else:
         ctype = msg.get_content_type()
         if ctype == 'text/plain':
-            parsed['body_text'] = msg.get_content() or ''
+            parsed['body_text'] = part_text(msg)
         elif ctype == 'text/html':
-            parsed['body_html'] = msg.get_content() or ''
+            parsed['body_html'] = part_text(msg)
 
     return parsed
 
@@ -50,7 +61,8 @@ def parse_eml(file_path):
 # Phishing detection helpers
 # -------------------------------
 def extract_urls(text):
-    url_pattern = r'(https?://[^\s]+)'
+    # Stop at quotes and angle brackets so href="..." values in HTML bodies come out clean
+    url_pattern = r'(https?://[^\s<>"\']+)'
     return re.findall(url_pattern, text or '')
 
 def find_suspicious_keywords(text):
@@ -86,7 +98,7 @@ def analyze_url_risk(urls, from_email):
 def analyze_attachment_risk(attachments):
     risky_extensions = ['.exe', '.js', '.docm', '.bat', '.scr', '.vbs', '.ps1']
     for att in attachments:
-        filename = att.get('filename', '').lower()
+        filename = (att.get('filename') or '').lower()
         att['risk'] = "Suspicious" if any(filename.endswith(ext) for ext in risky_extensions) else "Safe"
     return attachments
 
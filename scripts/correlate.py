@@ -1,140 +1,613 @@
 import os
 import re
+import sys
 import json
 import sqlite3
-from collections import defaultdict
-from datetime import datetime, timedelta
+import fcntl
+import time
+import argparse
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from schema import migrate, to_epoch
 
 # Existing Paths
 LOG_DIR = "logs"
 REPORT_DIR = "reports"
 CASES_FILE = os.path.join(REPORT_DIR, "cases.json")
 DB_PATH = "soc.db"
+INGEST_STATE_FILE = os.path.join(REPORT_DIR, "ingest_state.json")
+LOCK_FILE = os.path.join(REPORT_DIR, "correlate.lock")  # held for a whole run, see main()
+RUN_STATS_FILE = os.path.join(REPORT_DIR, "correlate_stats.json")  # read by /api/system_health
+INCIDENT_ID_BLOCK = 50  # incident numbers reserved per counter-file lock
+ALERT_BATCH_SIZE = 500  # alerts buffered before each DB sync while streaming
+TIMELINE_BATCH_SIZE = 5000  # timeline rows buffered per DB insert
+
+# Brute-force: N failed logins within the window, per source IP and per target user
+BRUTEFORCE_WINDOW = 600  # seconds
+BRUTEFORCE_THRESHOLDS = {3: "MEDIUM", 5: "HIGH"}
+BRUTEFORCE_MAX_KEYS = 50000  # IPs/users tracked at once; least recently seen are dropped
 
 os.makedirs(REPORT_DIR, exist_ok=True)
 
 # ------------------------------
-# 1. EXISTING HELPERS (Unchanged)
+# 1. HELPERS
 # ------------------------------
+class IncidentIdAllocator:
+    """Hands out incident numbers from blocks reserved in incident_counter.txt.
+
+    The counter file holds the highest number reserved so far. A block is
+    claimed under an exclusive flock, so concurrent correlators (auto_correlate
+    plus a manual run) never get the same number, and every ID in between is
+    served from memory.
+    """
+    def __init__(self, counter_file, block=INCIDENT_ID_BLOCK):
+        self.counter_file, self.block = counter_file, block
+        self.next, self.limit = 1, 0
+
+    def _locked_counter(self, update):
+        with open(self.counter_file, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            raw = f.read().strip()
+            last = int(raw) if raw else 0
+            new = update(last)
+            if new != last:
+                f.seek(0); f.truncate(); f.write(str(new)); f.flush()
+            return last
+
+    def allocate(self):
+        if self.next > self.limit:
+            last = self._locked_counter(lambda last: last + self.block)
+            self.next, self.limit = last + 1, last + self.block
+        n = self.next
+        self.next += 1
+        return n
+
+    def release(self):
+        """Returns the unused tail of our block if nobody reserved after us."""
+        if self.next > self.limit: return
+        unused_from, limit = self.next, self.limit
+        self._locked_counter(lambda last: unused_from - 1 if last == limit else last)
+        self.next, self.limit = 1, 0
+
+incident_ids = IncidentIdAllocator(os.path.join(REPORT_DIR, "incident_counter.txt"))
+
 def generate_incident_id():
-    counter_file = os.path.join(REPORT_DIR, "incident_counter.txt")
-    if not os.path.exists(counter_file):
-        with open(counter_file, "w") as f: f.write("1")
-        return "INC-2026-0001"
-    with open(counter_file, "r+") as f:
-        count = int(f.read().strip()) + 1
-        f.seek(0); f.write(str(count)); f.truncate()
-    return f"INC-2026-{count:04d}"
+    return f"INC-2026-{incident_ids.allocate():04d}"
+
+ISO_LINE_RE = re.compile(r"(\d{4}-\d{2}-\d{2}T[\d:.+-]+)\s+(.*)")
+SYSLOG_LINE_RE = re.compile(r"([A-Z][a-z]{2}\s+\d+\s+\d{2}:\d{2}:\d{2})\s+(.*)")
 
 def extract_timestamp_and_message(line):
-    iso = re.match(r"^(\d{4}-\d{2}-\d{2}T[\d:.+]+)\s+(.*)", line)
-    if iso: return iso.group(1), iso.group(2)
-    syslog = re.match(r"^([A-Z][a-z]{2}\s+\d+\s+\d{2}:\d{2}:\d{2})\s+(.*)", line)
-    if syslog: return syslog.group(1), syslog.group(2)
+    # The first character tells the formats apart, so each line gets one regex attempt
+    m = (ISO_LINE_RE if line[:1].isdigit() else SYSLOG_LINE_RE).match(line)
+    if m: return m.group(1), m.group(2)
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S"), line.strip()
 
 # ------------------------------
-# 2. EXISTING DETECTION ENGINES (Unchanged)
+# 2. DETECTION RULE ENGINE (Single pass)
 # ------------------------------
-def detect_bruteforce(events):
-    failed = defaultdict(int)
-    alerts = []
-    for ts, msg in events:
-        m = re.search(r"Failed password.*from (\d+\.\d+\.\d+\.\d+)", msg)
-        if m:
-            ip = m.group(1)
-            failed[ip] += 1
-            if failed[ip] in [3, 5]:
-                severity = "MEDIUM" if failed[ip] == 3 else "HIGH"
-                alerts.append({"incident_id": generate_incident_id(), "timestamp": ts, 
-                               "description": f"Brute-force detected from {ip}", "severity": severity})
-    return alerts
-
-def detect_privilege_escalation(events):
-    alerts = []
-    for ts, msg in events:
-        if "sudo:" in msg and "COMMAND=" in msg:
-            alerts.append({"incident_id": generate_incident_id(), "timestamp": ts, 
-                           "description": "Privilege escalation via sudo", "severity": "HIGH"})
-    return alerts
+# Each rule is (name, prefilter literals, match, fire):
+#   match(msg)            -> key for the rule (e.g. an IP) or None; stateless
+#   fire(ts, key, state)  -> alert dict or None; owns the per-rule counters
+# A line that contains none of the literals never reaches a regex.
+BRUTEFORCE_RE = re.compile(r"Failed password.*from (\d+\.\d+\.\d+\.\d+)")
+BRUTEFORCE_USER_RE = re.compile(r"Failed password for (?:invalid user )?(\S+) from")
+OUTBOUND_RE = re.compile(r"(CONNECT|POST|UPLOAD|curl|wget).*?(\d+\.\d+\.\d+\.\d+)")
+MALWARE_MARKERS = ("wget", "curl", "base64", "/tmp/", "/dev/shm")
 
-def detect_malware(events):
-    alerts = []
-    for ts, msg in events:
-        if re.search(r"(wget|curl|base64|/tmp/|/dev/shm)", msg):
-            alerts.append({"incident_id": generate_incident_id(), "timestamp": ts, 
-                           "description": "Suspicious malware execution activity", "severity": "HIGH"})
-    return alerts
-
-def detect_suspicious_outbound(events):
-    alerts = []
-    outbound_hits = defaultdict(int)
+class SlidingWindowCounter:
+    """Recent hit times per key, for "N hits within `window` seconds" rules.
+
+    Each key keeps at most `max_hits` timestamps (the largest threshold is all
+    a rule needs to see), keys idle for longer than the window are evicted,
+    and no more than `max_keys` keys are held, so memory stays bounded under
+    a spray from many sources.
+    """
+    def __init__(self, window, max_hits, max_keys, saved=None):
+        self.window, self.max_hits, self.max_keys = window, max_hits, max_keys
+        self.keys = OrderedDict()  # least recently hit first
+        for key, hits in (saved or {}).items():
+            # Checkpoints written before the windowed detector hold plain counts
+            if isinstance(hits, list): self.keys[key] = deque(hits, maxlen=max_hits)
+
+    def hit(self, key, t):
+        """Records a hit at epoch t and returns the hit count in the window (before, after)."""
+        hits = self.keys.pop(key, None) or deque(maxlen=self.max_hits)
+        # Files are read one after another, so time can jump back; hits a whole
+        # window in the future of t are no more "within the window" than old ones
+        if hits and hits[-1] - t >= self.window: hits.clear()
+        while hits and hits[0] <= t - self.window: hits.popleft()
+        before = len(hits)
+        hits.append(t)
+        self.keys[key] = hits
+        self._evict(t)
+        return before, len(hits)
+
+    def _evict(self, t):
+        while self.keys:
+            oldest = next(iter(self.keys.values()))
+            if len(self.keys) <= self.max_keys and oldest[-1] > t - self.window: break
+            self.keys.popitem(last=False)
+
+    def to_dict(self):
+        return {key: list(hits) for key, hits in self.keys.items()}
+
+def new_alert(ts, description, severity):
+    return {"incident_id": generate_incident_id(), "timestamp": ts, "epoch": to_epoch(ts),
+            "description": description, "severity": severity}
+
+def windowed_bruteforce(ts, key, counter, description):
+    # Fires once as the window count climbs through each threshold
+    before, after = counter.hit(key, to_epoch(ts) or int(time.time()))
+    if after in BRUTEFORCE_THRESHOLDS and before < after:
+        return new_alert(ts, description, BRUTEFORCE_THRESHOLDS[after])
+
+def match_bruteforce(msg):
+    m = BRUTEFORCE_RE.search(msg)
+    return m.group(1) if m else None
+
+def fire_bruteforce(ts, ip, state):
+    return windowed_bruteforce(ts, ip, state["failed"], f"Brute-force detected from {ip}")
+
+def match_bruteforce_user(msg):
+    m = BRUTEFORCE_USER_RE.search(msg)
+    return m.group(1) if m else None
+
+def fire_bruteforce_user(ts, user, state):
+    return windowed_bruteforce(ts, user, state["failed_users"], f"Brute-force against user {user}")
+
+def match_privilege_escalation(msg):
+    return "sudo:" in msg or None
+
+def fire_privilege_escalation(ts, _, state):
+    return new_alert(ts, "Privilege escalation via sudo", "HIGH")
+
+def match_malware(msg):
+    # The prefilter literals are the whole pattern, so reaching here is a hit
+    return True
+
+def fire_malware(ts, _, state):
+    return new_alert(ts, "Suspicious malware execution activity", "HIGH")
+
+def match_suspicious_outbound(msg):
+    m = OUTBOUND_RE.search(msg)
+    return m.group(2) if m else None
+
+def fire_suspicious_outbound(ts, ip, state):
+    outbound_hits = state["outbound_hits"]
+    outbound_hits[ip] += 1
+    if outbound_hits[ip] >= 3:
+        return new_alert(ts, f"Suspicious outbound traffic to {ip}", "HIGH")
+
+RULES = [
+    ("bruteforce", ("Failed password",), match_bruteforce, fire_bruteforce),
+    ("bruteforce_user", ("Failed password",), match_bruteforce_user, fire_bruteforce_user),
+    ("privilege_escalation", ("COMMAND=",), match_privilege_escalation, fire_privilege_escalation),
+    ("malware", MALWARE_MARKERS, match_malware, fire_malware),
+    ("suspicious_outbound", ("CONNECT", "POST", "UPLOAD", "curl", "wget"),
+     match_suspicious_outbound, fire_suspicious_outbound),
+]
+
+# One alternation over every rule's literals: most lines are rejected by a single scan
+PREFILTER_RE = re.compile("|".join(sorted({re.escape(lit) for _, lits, _, _ in RULES for lit in lits})))
+
+def new_detector_state(saved=None):
+    """Per-key counters shared by the stateful rules; `saved` restores a checkpoint."""
+    saved = saved or {}
+    def window(name):
+        return SlidingWindowCounter(BRUTEFORCE_WINDOW, max(BRUTEFORCE_THRESHOLDS),
+                                    BRUTEFORCE_MAX_KEYS, saved.get(name))
+    return {"failed": window("failed"), "failed_users": window("failed_users"),
+            "outbound_hits": defaultdict(int, saved.get("outbound_hits", {}))}
+
+def match_event(msg):
+    """Yields (rule name, key) for every rule that matches msg."""
+    if not PREFILTER_RE.search(msg): return
+    for name, literals, match, _ in RULES:
+        if any(lit in msg for lit in literals):
+            key = match(msg)
+            if key is not None: yield name, key
+
+FIRE = {name: fire for name, _, _, fire in RULES}
+
+def run_detections(events, state):
+    """Dispatches each event once to the rules it matches, yielding alerts as they fire."""
     for ts, msg in events:
-        m = re.search(r"(CONNECT|POST|UPLOAD|curl|wget).*?(\d+\.\d+\.\d+\.\d+)", msg)
-        if m:
-            ip = m.group(2); outbound_hits[ip] += 1
-            if outbound_hits[ip] >= 3:
-                alerts.append({"incident_id": generate_incident_id(), "timestamp": ts, 
-                               "description": f"Suspicious outbound traffic to {ip}", "severity": "HIGH"})
-    return alerts
+        for name, key in match_event(msg):
+            alert = FIRE[name](ts, key, state)
+            if alert: yield alert
 
 # ------------------------------
-# 3. NEW: DATABASE SYNC BRIDGE
+# 3. INCREMENTAL INGESTION (Per-file checkpoints)
+# ------------------------------
+def new_ingest_state():
+    return {"files": {}, "failed": {}, "failed_users": {}, "outbound_hits": {}}
+
+def load_ingest_state():
+    """Loads per-file inode/offset checkpoints and the detector counters; None if there are none."""
+    if not os.path.exists(INGEST_STATE_FILE): return None
+    state = new_ingest_state()
+    try:
+        with open(INGEST_STATE_FILE) as f: state.update(json.load(f))
+    except (OSError, ValueError):
+        print("⚠️ Ingest state unreadable, rebuilding from the start of the logs.")
+        return None
+    return state
+
+def write_json_atomic(path, data):
+    # Write-then-rename so a crash (or a concurrent reader) never sees a half file
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f: json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+def save_ingest_state(state):
+    write_json_atomic(INGEST_STATE_FILE, state)
+
+def _find_rotated(log_dir, inode):
+    """Returns the path that now holds a rotated-away inode (e.g. auth.log.1)."""
+    for name in os.listdir(log_dir):
+        path = os.path.join(log_dir, name)
+        try:
+            if os.stat(path).st_ino == inode: return path
+        except OSError:
+            continue
+    return None
+
+def _read_from(path, offset, tail=False):
+    """Yields (line, new_offset) for complete lines after offset.
+
+    With tail, a last line without a newline is yielded too, but the offset
+    stays before it.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for raw in f:
+            # A missing newline means the writer may be mid-line; pick it up next tick
+            if not raw.endswith(b"\n"):
+                if tail: yield raw.decode("utf-8", errors="ignore"), offset
+                break
+            offset += len(raw)
+            yield raw.decode("utf-8", errors="ignore"), offset
+
+def read_new_lines(path, checkpoint, tail=False):
+    """Yields only the lines appended to path since its checkpoint.
+
+    The checkpoint dict ({"inode", "offset"}) is updated in place as lines are
+    consumed. A new inode means the file was rotated: the tail of the old file
+    is drained first if it is still in the log dir. A file smaller than the
+    saved offset was truncated and is re-read from the start.
+
+    A final line without a newline is held back unless `tail` is set (full
+    runs over static archives); even then the checkpoint stays before it, so
+    an incremental tick re-reads it once complete and the dedup index absorbs
+    the repeat alert.
+    """
+    st = os.stat(path)
+    inode, offset = checkpoint.get("inode"), checkpoint.get("offset", 0)
+
+    if inode is not None and inode != st.st_ino:
+        rotated = _find_rotated(os.path.dirname(path), inode)
+        if rotated:
+            for line, _ in _read_from(rotated, offset, tail): yield line
+        offset = 0
+    elif st.st_size < offset:
+        offset = 0
+
+    checkpoint.update(inode=st.st_ino, offset=offset)
+    for line, offset in _read_from(path, offset, tail):
+        checkpoint["offset"] = offset
+        yield line
+
+# ------------------------------
+# 4. NEW: DATABASE SYNC BRIDGE
 # ------------------------------
 def sync_to_db(alerts):
     """Pushes detected alerts into the SQL database for the React Frontend."""
     conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    for a in alerts:
-        # Check if alert already exists to prevent duplicates
-        cur.execute("SELECT 1 FROM alerts WHERE description = ? AND timestamp = ?", (a['description'], a['timestamp']))
-        if not cur.fetchone():
-            cur.execute("""
-                INSERT INTO alerts (alert_id, source, severity, description, status, timestamp)
-                VALUES (?, ?, ?, ?, 'OPEN', ?)
-            """, (a['incident_id'], "LOG", a['severity'], a['description'], a['timestamp']))
-    conn.commit()
+    # One transaction; duplicates are dropped by the dedup index instead of a SELECT per alert.
+    # Only that conflict is ignored: any other constraint violation (e.g. alert_id) still raises.
+    with conn:
+        conn.executemany("""
+            INSERT INTO alerts (alert_id, source, severity, description, status, timestamp, ts_epoch)
+            VALUES (?, ?, ?, ?, 'OPEN', ?, ?)
+            ON CONFLICT (description, timestamp) DO NOTHING
+        """, [(a['incident_id'], "LOG", a['severity'], a['description'], a['timestamp'], a['epoch'] or 0)
+              for a in alerts])
     conn.close()
 
+def reset_timeline(conn, csv_file):
+    """Full rebuild: drops the LOG events from the timeline table and timeline.csv.
+
+    Analyst and system entries stay in the table. The ones the backend's
+    timeline_exporter already appended to the CSV (up to its export cursor) are
+    written back, in its line format; later ones are still the exporter's to
+    write. The exporter holds the write lock from reading its cursor until it
+    has appended its lines and moved the cursor, so taking the lock here keeps
+    the read, the truncate and its exports from interleaving.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM timeline WHERE source = 'LOG'")
+        row = conn.execute("SELECT last_id FROM export_cursors WHERE name = 'timeline_csv'").fetchone()
+        exported = conn.execute("""
+            SELECT timestamp, incident_id, description FROM timeline
+            WHERE id <= ? AND source != 'LOG' ORDER BY id
+        """, (row[0] if row else 0,))
+        csv_file.truncate(0)
+        csv_file.write("Timestamp,Description\n")
+        csv_file.writelines(f"{ts}, {ref}, {desc}\n" for ts, ref, desc in exported)
+        csv_file.flush()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+class TimelineWriter:
+    """Writes events to timeline.csv and, in batches, to the timeline table."""
+    def __init__(self, f, conn):
+        self.f, self.conn, self.batch = f, conn, []
+
+    def write(self, ts, msg):
+        self.f.write(f"{ts},{msg}\n")
+        self.batch.append((to_epoch(ts) or 0, ts, msg))
+        if len(self.batch) >= TIMELINE_BATCH_SIZE: self.flush()
+
+    def copy_part(self, path, stage):
+        """Appends a worker's CSV part and bulk-loads its staged rows (parallel mode).
+
+        The worker already computed ts_epoch, so the parent does no per-line
+        work: the CSV is copied as-is and the rows move in one INSERT ... SELECT.
+        """
+        self.flush()  # keeps file order; ATTACH also needs no open transaction
+        with open(path) as part: shutil.copyfileobj(part, self.f)
+        self.conn.execute("ATTACH DATABASE ? AS part", (stage,))
+        try:
+            with self.conn:
+                self.conn.execute("""
+                    INSERT INTO main.timeline (ts_epoch, timestamp, description, source)
+                    SELECT ts_epoch, timestamp, description, source FROM part.timeline ORDER BY rowid
+                """)
+        finally:
+            self.conn.execute("DETACH DATABASE part")
+
+    def flush(self):
+        if not self.batch: return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO timeline (ts_epoch, timestamp, description, source) VALUES (?, ?, ?, 'LOG')",
+                self.batch)
+        self.batch = []
+
+# ------------------------------
+# 5. PARALLEL MODE (--workers N)
+# ------------------------------
+def scan_file(job):
+    """Worker: parses and pre-filters one log file.
+
+    The file's timeline rows go to a temp CSV part and, with ts_epoch already
+    computed, to a staging SQLite file; only the rule hits (ts, rule name,
+    key) are sent back, in line order. The stateful fire() half of each rule
+    runs in the parent.
+    """
+    path, checkpoint, tail = job
+    lines = read_new_lines(path, checkpoint, tail)
+    fd, part = tempfile.mkstemp(dir=REPORT_DIR, suffix=".timeline.part")
+    stage_fd, stage = tempfile.mkstemp(dir=REPORT_DIR, suffix=".timeline.db")
+    os.close(stage_fd)
+    # Throwaway file: no journal, no fsync
+    stage_conn = sqlite3.connect(stage)
+    stage_conn.execute("PRAGMA journal_mode=OFF")
+    stage_conn.execute("PRAGMA synchronous=OFF")
+    stage_conn.execute("CREATE TABLE timeline (ts_epoch INTEGER, timestamp TEXT, description TEXT, source TEXT)")
+    hits = []
+    with os.fdopen(fd, "w") as f:
+        staged = TimelineWriter(f, stage_conn)
+        for ts, msg in tee_timeline(parse_events(lines), staged.write):
+            for name, key in match_event(msg): hits.append((ts, name, key))
+        staged.flush()
+    stage_conn.close()
+    return part, stage, hits, checkpoint
+
+def run_parallel(state, timeline, detector_state, workers, tail):
+    """Scans files in a process pool, then merges them in file order.
+
+    Replaying each file's hits through fire() in sorted-file order updates the
+    shared detector counters exactly as a sequential run would, so
+    cross-file thresholds fire on the same events with any worker count.
+    """
+    files = log_files()
+    jobs = [(os.path.join(LOG_DIR, file), state["files"].get(file, {}), tail) for file in files]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for file, (part, stage, hits, checkpoint) in zip(files, pool.map(scan_file, jobs)):
+            timeline.copy_part(part, stage)
+            os.remove(part)
+            os.remove(stage)
+            state["files"][file] = checkpoint
+            for ts, name, key in hits:
+                alert = FIRE[name](ts, key, detector_state)
+                if alert: yield alert
+
 # ------------------------------
-# 4. REFINED MAIN ENGINE
+# 6. REFINED MAIN ENGINE
 # ------------------------------
+def parse_args():
+    parser = argparse.ArgumentParser(description="Correlate logs into SOC alerts.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only read bytes appended since the last run (uses reports/ingest_state.json, "
+                             "which every run saves; without it the reports are rebuilt)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="parse and pre-filter log files in N worker processes")
+    # auto_correlate.py passes the log/report dirs positionally; they match the defaults.
+    parser.add_argument("dirs", nargs="*", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def log_files():
+    return sorted(f for f in os.listdir(LOG_DIR) if f.endswith(".log"))
+
+def iter_log_lines(state, tail):
+    """Reader stage: yields raw lines from every *.log file, one file at a time."""
+    for file in log_files():
+        yield from read_new_lines(os.path.join(LOG_DIR, file), state["files"].setdefault(file, {}), tail)
+
+def parse_events(lines):
+    """Timestamp stage: turns raw lines into (ts, msg) events."""
+    for line in lines:
+        ts, msg = extract_timestamp_and_message(line.strip())
+        if ts: yield ts, msg
+
+def tee_timeline(events, sink):
+    """Timeline sink: hands each event to sink(ts, msg) on its way to the detectors."""
+    for ts, msg in events:
+        sink(ts, msg)
+        yield ts, msg
+
+class JsonArrayWriter:
+    """
+    Writes a JSON array one item at a time. Nothing is read or written until the
+    first item arrives, so a tick without alerts leaves the file untouched.
+
+    A new array goes to a .tmp file that replaces the old one on close. In
+    append mode an existing array is extended in place from its closing "]",
+    so a tick costs what it adds, not the size of the history.
+    """
+    def __init__(self, path, append=False):
+        self.path, self.tmp, self.append = path, path + ".tmp", append
+        self.count, self.empty, self.f, self.in_place = 0, True, None, False
+
+    def _appending(self):
+        return self.append and os.path.exists(self.path) and os.path.getsize(self.path)
+
+    def check(self):
+        """Raises ValueError now, rather than at the first item, if the array can't be appended to."""
+        if self._appending():
+            with open(self.path, "rb") as f: self._end_of_items(f)
+
+    def _open(self):
+        if self._appending():
+            self.f, self.in_place = open(self.path, "r+b"), True
+            end, self.empty = self._end_of_items(self.f)
+            self.f.seek(end)
+            self.f.truncate()
+        else:
+            self.f = open(self.tmp, "wb")
+            self.f.write(b"[")
+
+    def _end_of_items(self, f):
+        """Returns (offset just past the last item, whether the array is empty)."""
+        # Only whitespace and the "]" follow the last item, so the tail is enough.
+        # A tick that died after writing an item leaves no "]"; appending carries on.
+        size = f.seek(0, os.SEEK_END)
+        start = f.seek(max(0, size - 4096))
+        items = f.read().rstrip()
+        if items.endswith(b"]"): items = items[:-1].rstrip()
+        if not items.endswith((b"[", b"}")):
+            raise ValueError(f"{self.path} does not end in a JSON array of objects")
+        return start + len(items), items.endswith(b"[")
+
+    def _write(self, item):
+        self.f.write(b"\n" if self.empty else b",\n")
+        self.f.write(json.dumps(item, indent=4).encode())
+        self.empty = False
+
+    def write(self, item):
+        if self.f is None: self._open()
+        self._write(item)
+        self.count += 1
+
+    def close(self):
+        if self.f is None: return
+        self.f.write(b"\n]")
+        self.f.close()
+        if not self.in_place: os.replace(self.tmp, self.path)
+
 def main():
-    events = []
+    args = parse_args()
+    # One run at a time: the checkpoint, cases.json and timeline.csv are shared,
+    # so e.g. an auto_correlate tick waits for the backend's startup run to finish
+    with open(LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        correlate(args)
+
+def correlate(args):
+    started = time.time()
     if not os.path.exists(LOG_DIR): os.makedirs(LOG_DIR)
+    state = load_ingest_state() if args.incremental else None
+    # Without a checkpoint an incremental tick would append the whole log
+    # history to the reports a second time, so it rebuilds them instead
+    rebuild = state is None
+    if rebuild:
+        if args.incremental: print("ℹ️ No ingest checkpoint yet, rebuilding the reports.")
+        state = new_ingest_state()
+    # Ticks may catch a writer mid-line; a one-off run reads every file to its end
+    tail = not args.incremental
+    # In incremental mode the per-IP counters carry over between ticks
+    detector_state = new_detector_state(state)
+
+    # Reports are appended to, rather than rewritten, in incremental mode.
+    # timeline.csv is always opened for append: the backend appends to it too.
+    timeline_path = os.path.join(REPORT_DIR, "timeline.csv")
+    mode = "w" if rebuild else "a"
+    new_timeline = not os.path.exists(timeline_path)
+
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Creates or upgrades soc.db; sync_to_db relies on the dedup index it guarantees.
+    # It also imports a legacy timeline.csv before the rebuild below truncates it.
+    migrate(conn, timeline_path)
+
+    # Pipeline: logs -> events -> timeline (CSV + DB) -> detectors -> findings/cases/DB
+    total, pending = 0, []
+    cases = JsonArrayWriter(CASES_FILE, append=not rebuild)
+    # Fail before anything is appended: a later failure would leave the lines
+    # in timeline.csv without a checkpoint, and every tick would repeat them
+    cases.check()
+    with open(timeline_path, "a") as timeline_csv, \
+         open(os.path.join(REPORT_DIR, "findings.txt"), mode) as findings:
+        # A full run rebuilds the log events; analyst and system entries are kept
+        if rebuild: reset_timeline(conn, timeline_csv)
+        elif new_timeline: timeline_csv.write("Timestamp,Description\n")
+        timeline = TimelineWriter(timeline_csv, conn)
+        if args.workers > 1:
+            alerts = run_parallel(state, timeline, detector_state, args.workers, tail)
+        else:
+            events = tee_timeline(parse_events(iter_log_lines(state, tail)), timeline.write)
+            alerts = run_detections(events, detector_state)
+        for alert in alerts:
+            findings.write(f"[{alert['severity']}] {alert['description']}\n")
+            findings.flush()
+            cases.write(alert)
+            pending.append(alert)
+            total += 1
+            if len(pending) >= ALERT_BATCH_SIZE:
+                sync_to_db(pending); pending = []
+        timeline.flush()
+    conn.close()
+    if pending: sync_to_db(pending)
+    cases.close()
+    incident_ids.release()
+
+    # Checkpoint only after everything above was persisted. Full runs save one
+    # too, so the next --incremental tick carries on from where they stopped
+    state["failed"] = detector_state["failed"].to_dict()
+    state["failed_users"] = detector_state["failed_users"].to_dict()
+    state["outbound_hits"] = dict(detector_state["outbound_hits"])
+    save_ingest_state(state)
 
-    # 1. Ingest Logs
-    for file in os.listdir(LOG_DIR):
-        if file.endswith(".log"):
-            with open(os.path.join(LOG_DIR, file), "r", errors="ignore") as f:
-                for line in f:
-                    ts, msg = extract_timestamp_and_message(line.strip())
-                    if ts: events.append((ts, msg))
-
-    # 2. Run All Detections
-    alerts = []
-    alerts += detect_bruteforce(events)
-    alerts += detect_privilege_escalation(events)
-    alerts += detect_malware(events)
-    alerts += detect_suspicious_outbound(events)
-
-    # 3. Persistence (JSON + SQL)
-    if alerts:
-        # Save to JSON (Old method)
-        with open(CASES_FILE, "w") as f: json.dump(alerts, f, indent=4)
-        
-        # Sync to DB (New method for Frontend)
-        sync_to_db(alerts)
-
-    # 4. Generate Reports
-    with open(os.path.join(REPORT_DIR, "findings.txt"), "w") as f:
-        for a in alerts: f.write(f"[{a['severity']}] {a['description']}\n")
-
-    with open(os.path.join(REPORT_DIR, "timeline.csv"), "w") as f:
-        f.write("Timestamp,Description\n")
-        for ts, msg in events: f.write(f"{ts},{msg}\n")
-
-    print(f"✅ Correlation Complete. {len(alerts)} alerts processed and synced to DB.")
+    duration = time.time() - started
+    write_json_atomic(RUN_STATS_FILE, {
+        "finished_at": int(time.time()),
+        "duration_seconds": round(duration, 3),
+        "alerts": total,
+        "alerts_per_sec": round(total / duration, 1) if duration else 0,
+        "incremental": not rebuild
+    })
+    print(f"✅ Correlation Complete. {total} alerts processed and synced to DB.")
 
 if __name__ == "__main__":
     main()
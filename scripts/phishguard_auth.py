@@ -1,29 +1,138 @@
 import dns.resolver
 import dns.exception
 import re
-from typing import Dict, Tuple, Optional
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, List, Tuple, Optional
 import time
+from phishguard_dns import SystemResolverBackend, SQLiteCacheBackend, resolver_backend_from_env
+
+DNS_CACHE_SIZE = 4096  # cached (name, type) answers; least recently used are evicted
+DNS_NEGATIVE_TTL = 300  # seconds to remember NXDOMAIN / NoAnswer
+DNS_MAX_TTL = 3600  # cap on how long a positive answer is trusted, whatever its TTL
+DKIM_SELECTORS = [
+    'default', 'google', 'selector1', 'selector2',
+    'k1', 'dkim', 's1', 's2', 'eversrl', 'mail',
+    'protonmail', 'zoho', 'sendgrid', 'mandrill'
+]
+DKIM_PROBE_LIFETIME = 2  # seconds a guessed selector may take; the usual answer is NXDOMAIN within one round trip
+DNS_CONCURRENT_CHECKS = 4  # checks whose full fan-out (every selector plus SPF and DMARC) fits in the pool
+DNS_WORKERS = DNS_CONCURRENT_CHECKS * (len(DKIM_SELECTORS) + 2)
+
+class DNSCache:
+    """Thread-safe LRU of DNS answers that expire with their record TTL.
+
+    Values are (error, strings): error is None for an answer, or "NXDOMAIN" /
+    "NoAnswer" for a negative one, which is kept for negative_ttl seconds.
+    """
+    def __init__(self, max_entries=DNS_CACHE_SIZE, negative_ttl=DNS_NEGATIVE_TTL, max_ttl=DNS_MAX_TTL):
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self.max_ttl = max_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + min(ttl, self.max_ttl), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def put_negative(self, key, error):
+        self.put(key, (error, None), self.negative_ttl)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+DKIM_TAG_RE = re.compile(r'(?:^|;)\s*([sd])\s*=\s*([^;\s]+)')
+
+def dkim_signatures(headers) -> List[Tuple[str, str]]:
+    """
+    Declared (selector, signing domain) pairs from a message's DKIM-Signature headers.
+    headers is an email.message.Message or a mapping of header name to a value or list of values.
+    """
+    if headers is None:
+        return []
+    if hasattr(headers, 'get_all'):
+        values = headers.get_all('DKIM-Signature') or []
+    else:
+        values = headers.get('DKIM-Signature') or []
+        if isinstance(values, str):
+            values = [values]
+    pairs = []
+    for value in values:
+        tags = dict(DKIM_TAG_RE.findall(re.sub(r'\s+', ' ', str(value))))
+        pair = (tags.get('s', '').strip(), tags.get('d', '').strip().lower().rstrip('.'))
+        if all(pair) and pair not in pairs:
+            pairs.append(pair)
+    return pairs
+
+# Shared by every EmailAuthChecker, so repeat senders skip DNS entirely
+dns_cache = DNSCache()
+# Threads that issue DNS queries concurrently; lookups are network-bound. Sized for
+# several checks at once, so one upload's slow leftovers don't queue the next
+dns_pool = ThreadPoolExecutor(max_workers=DNS_WORKERS, thread_name_prefix="dns")
 
 class EmailAuthChecker:
-    def __init__(self, timeout=10):
-        self.resolver = dns.resolver.Resolver()
-        self.resolver.timeout = timeout
-        self.resolver.lifetime = timeout
+    def __init__(self, timeout=10, cache=None, backend=None):
+        # backend: anything with txt(name) -> (strings, ttl), see phishguard_dns
+        self.backend = SystemResolverBackend(timeout) if backend is None else backend
+        self.cache = dns_cache if cache is None else cache
+    
+    def lookup_txt(self, name: str, lifetime: Optional[float] = None) -> List[str]:
+        """
+        TXT strings for name, served from the cache while the record's TTL lasts.
+        Raises NXDOMAIN / NoAnswer like resolver.resolve(), including from cache.
+        lifetime (seconds) overrides the backend's timeout for this lookup.
+        """
+        key = (name.lower().rstrip('.'), 'TXT')
+        cached = self.cache.get(key)
+        if cached is None:
+            try:
+                strings, ttl = self.backend.txt(name, lifetime=lifetime)
+            except dns.resolver.NXDOMAIN:
+                self.cache.put_negative(key, 'NXDOMAIN')
+                raise
+            except dns.resolver.NoAnswer:
+                self.cache.put_negative(key, 'NoAnswer')
+                raise
+            cached = (None, strings)
+            self.cache.put(key, cached, ttl)
+        error, strings = cached
+        if error == 'NXDOMAIN':
+            raise dns.resolver.NXDOMAIN()
+        if error == 'NoAnswer':
+            raise dns.resolver.NoAnswer()
+        return strings
     
     def check_spf(self, domain: str, ip_address: str = None) -> Dict:
         """
         Check SPF records for a domain
         """
         try:
-            answers = self.resolver.resolve(domain, 'TXT')
             spf_record = None
             
-            for rdata in answers:
-                for txt_string in rdata.strings:
-                    txt_str = txt_string.decode('utf-8').strip()
-                    if txt_str.lower().startswith('v=spf1'):
-                        spf_record = txt_str
-                        break
+            for txt_str in self.lookup_txt(domain):
+                if txt_str.lower().startswith('v=spf1'):
+                    spf_record = txt_str
+                    break
             
             if not spf_record:
                 return {'exists': False, 'record': None, 'error': 'No SPF record found'}
@@ -45,21 +154,17 @@ class EmailAuthChecker:
         except dns.exception.DNSException as e:
             return {'exists': False, 'record': None, 'error': f'DNS query failed: {str(e)}'}
     
-    def check_dkim(self, domain: str, selector: str = 'default') -> Dict:
+    def check_dkim(self, domain: str, selector: str = 'default', lifetime: Optional[float] = None) -> Dict:
         """
         Check DKIM records for a domain
         """
         try:
             dkim_query = f'{selector}._domainkey.{domain}'
-            answers = self.resolver.resolve(dkim_query, 'TXT')
-            
             dkim_record = None
-            for rdata in answers:
-                for txt_string in rdata.strings:
-                    txt_str = txt_string.decode('utf-8').strip()
-                    if 'v=dkim1' in txt_str.lower():
-                        dkim_record = txt_str
-                        break
+            for txt_str in self.lookup_txt(dkim_query, lifetime):
+                if 'v=dkim1' in txt_str.lower():
+                    dkim_record = txt_str
+                    break
             
             if not dkim_record:
                 return {
@@ -95,7 +200,8 @@ class EmailAuthChecker:
                 'exists': False, 
                 'record': None, 
                 'error': f'DNS query failed: {str(e)}',
-                'selector_tried': selector
+                'selector_tried': selector,
+                'lookup_failed': True
             }
     
     def check_dmarc(self, domain: str) -> Dict:
@@ -104,15 +210,11 @@ class EmailAuthChecker:
         """
         try:
             dmarc_query = f'_dmarc.{domain}'
-            answers = self.resolver.resolve(dmarc_query, 'TXT')
-            
             dmarc_record = None
-            for rdata in answers:
-                for txt_string in rdata.strings:
-                    txt_str = txt_string.decode('utf-8').strip()
-                    if txt_str.lower().startswith('v=dmarc1'):
-                        dmarc_record = txt_str
-                        break
+            for txt_str in self.lookup_txt(dmarc_query):
+                if txt_str.lower().startswith('v=dmarc1'):
+                    dmarc_record = txt_str
+                    break
             
             if not dmarc_record:
                 return {'exists': False, 'record': None, 'error': 'No DMARC record found'}
@@ -138,25 +240,33 @@ class EmailAuthChecker:
     
     def check_dkim_with_multiple_selectors(self, domain: str) -> Dict:
         """
-        Try multiple common DKIM selectors
-        """
-        common_selectors = [
-            'default', 'google', 'selector1', 'selector2', 
-            'k1', 'dkim', 's1', 's2', 'eversrl', 'mail',
-            'protonmail', 'zoho', 'sendgrid', 'mandrill'
-        ]
+        Try multiple common DKIM selectors, all at once
         
-        all_results = []
+        Returns the first selector that answers with a DKIM record; lookups
+        still queued are cancelled, so the cost is about one DNS round trip.
+        Ones already running can't be, so each guess gets DKIM_PROBE_LIFETIME
+        rather than the full timeout before its pool thread is free again.
+        """
+        common_selectors = DKIM_SELECTORS
+        futures = {dns_pool.submit(self.check_dkim, domain, selector, DKIM_PROBE_LIFETIME): selector
+                   for selector in common_selectors}
+        pending = set(futures)
         
-        for selector in common_selectors:
-            result = self.check_dkim(domain, selector)
-            all_results.append(result)
-            if result['exists']:
-                print(f"✅ Found DKIM with selector: {selector}")
-                result['all_selectors_tried'] = common_selectors
-                return result
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    if result['exists']:
+                        print(f"✅ Found DKIM with selector: {futures[future]}")
+                        result['all_selectors_tried'] = common_selectors
+                        return result
+        finally:
+            for future in pending:
+                future.cancel()
         
         # If none found, return comprehensive result
+        all_results = [future.result() for future in futures]
         return {
             'exists': False,
             'record': None,
@@ -165,6 +275,60 @@ class EmailAuthChecker:
             'all_results': all_results
         }
     
+    def check_declared_dkim(self, domain: str, signatures: List[Tuple[str, str]]) -> Dict:
+        """
+        Check exactly the selector(s) the message's DKIM-Signature headers declare
+
+        Only a signature aligned with the From domain counts. If none is, the From
+        domain's common selectors are probed as if nothing was declared, and the
+        unaligned signature is kept under 'unaligned_signature' for display.
+        """
+        # Domain names are case-insensitive; d= is already normalised by dkim_signatures()
+        from_domain = domain.lower().rstrip('.')
+        futures = [dns_pool.submit(self.check_dkim, signing_domain, selector)
+                   for selector, signing_domain in signatures]
+        all_results = [future.result() for future in futures]
+        
+        unaligned = None
+        for (selector, signing_domain), result in zip(signatures, all_results):
+            if not result['exists']:
+                continue
+            result['declared'] = True
+            result['signing_domain'] = signing_domain
+            # Relaxed DMARC alignment: d= is the From domain or a parent of it
+            result['aligned'] = from_domain == signing_domain or from_domain.endswith('.' + signing_domain)
+            if result['aligned']:
+                print(f"✅ Found DKIM with declared selector: {selector} (d={signing_domain})")
+                return result
+            unaligned = unaligned or result
+        
+        if unaligned is not None:
+            print(f"⚠️ DKIM signature d={unaligned['signing_domain']} is not aligned with {domain}")
+            result = self.check_dkim_with_multiple_selectors(domain)
+            result['unaligned_signature'] = unaligned
+            if not result['exists']:
+                result['error'] = (f"DKIM signature d={unaligned['signing_domain']} is not aligned with "
+                                   f"{domain}; {result['error']}")
+            return result
+        
+        # A timeout or SERVFAIL says nothing about what is published
+        failed = [(f'{s}._domainkey.{d}', r) for (s, d), r in zip(signatures, all_results) if r.get('lookup_failed')]
+        if failed:
+            error = ('DKIM lookup failed for the declared selector(s): ' +
+                     ', '.join(name for name, _ in failed) + f' ({failed[0][1]["error"]})')
+        else:
+            error = ('No DKIM record published for the declared selector(s): ' +
+                     ', '.join(f'{s}._domainkey.{d}' for s, d in signatures))
+        return {
+            'exists': False,
+            'record': None,
+            'declared': True,
+            'error': error,
+            'lookup_failed': bool(failed),
+            'selectors_tried': [s for s, _ in signatures],
+            'all_results': all_results
+        }
+    
     def validate_spf_syntax(self, spf_record: str) -> bool:
         """Validate basic SPF syntax"""
         try:
@@ -202,16 +366,25 @@ class EmailAuthChecker:
         match = re.search(f'{key}=([^;]+)', dmarc_record, re.IGNORECASE)
         return match.group(1) if match else None
     
-    def comprehensive_check(self, domain: str, from_ip: str = None) -> Dict:
+    def comprehensive_check(self, domain: str, from_ip: str = None,
+                            signatures: Optional[List[Tuple[str, str]]] = None) -> Dict:
         """
         Perform comprehensive email authentication check
+        
+        signatures are the message's declared DKIM (selector, domain) pairs; only
+        without them are the common selectors guessed.
         """
         print(f"🔍 Checking email authentication for: {domain}")
         
-        # Perform all checks
-        spf_result = self.check_spf(domain, from_ip)
-        dkim_result = self.check_dkim_with_multiple_selectors(domain)
-        dmarc_result = self.check_dmarc(domain)
+        # Perform all checks: SPF and DMARC resolve while DKIM selectors are probed
+        spf_future = dns_pool.submit(self.check_spf, domain, from_ip)
+        dmarc_future = dns_pool.submit(self.check_dmarc, domain)
+        if signatures:
+            dkim_result = self.check_declared_dkim(domain, signatures)
+        else:
+            dkim_result = self.check_dkim_with_multiple_selectors(domain)
+        spf_result = spf_future.result()
+        dmarc_result = dmarc_future.result()
         
         results = {
             'domain': domain,
@@ -253,9 +426,10 @@ class EmailAuthChecker:
         
         return results
 
-    def check_email_auth(self, email_address: str) -> Dict:
+    def check_email_auth(self, email_address: str, headers=None) -> Dict:
         """
         Method for email authentication check
+        headers (optional) are the message headers, used for its DKIM-Signature
         """
         # Extract domain from email
         if '@' in email_address:
@@ -264,22 +438,36 @@ class EmailAuthChecker:
             domain = email_address
             email_address = f"test@{domain}"  # Create a dummy email for display
         
-        results = self.comprehensive_check(domain)
+        results = self.comprehensive_check(domain, signatures=dkim_signatures(headers))
         results['checked_email'] = email_address
         results['checked_domain'] = domain
         
         return results
 
+_shared_checker = None
+
+def shared_checker() -> EmailAuthChecker:
+    """One checker (and resolver) per process instead of one per call."""
+    global _shared_checker
+    if _shared_checker is None:
+        _shared_checker = EmailAuthChecker(backend=resolver_backend_from_env())
+    return _shared_checker
+
+def auth_query_names(domain: str) -> List[str]:
+    """Every TXT name an auth check of domain may look up"""
+    return [domain, f'_dmarc.{domain}'] + [f'{s}._domainkey.{domain}' for s in DKIM_SELECTORS]
+
 # Standalone function for direct import
-def check_email_auth(email_input):
+def check_email_auth(email_input, headers=None):
     """
     Standalone function that can handle both email addresses and domains
+    Pass the message headers to check its declared DKIM selector(s) instead of guessing.
     """
-    checker = EmailAuthChecker()
+    checker = shared_checker()
     
     # If it's a string and contains @, treat as email address
     if isinstance(email_input, str) and '@' in email_input:
-        return checker.check_email_auth(email_input)
+        return checker.check_email_auth(email_input, headers)
     
     # If it's bytes, try to extract email from headers
     elif isinstance(email_input, bytes):
@@ -293,7 +481,7 @@ def check_email_auth(email_input):
             email_match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', from_header)
             if email_match:
                 email_addr = email_match.group(0)
-                return checker.check_email_auth(email_addr)
+                return checker.check_email_auth(email_addr, msg)
             else:
                 return {"error": "No email address found in message headers"}
         except Exception as e:
@@ -302,14 +490,27 @@ def check_email_auth(email_input):
     # Fallback: treat as domain
     else:
         domain = str(email_input)
-        return checker.comprehensive_check(domain)
+        return checker.comprehensive_check(domain, signatures=dkim_signatures(headers))
+
+def prewarm(domains_file: str, cache_path: str):
+    """Fills the persistent DNS cache with every auth record of the listed domains"""
+    with open(domains_file) as f:
+        domains = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    upstream = resolver_backend_from_env()
+    if isinstance(upstream, SQLiteCacheBackend):
+        upstream = upstream.upstream or SystemResolverBackend()
+    cache = SQLiteCacheBackend(cache_path, upstream=upstream)
+    names = [name for domain in domains for name in auth_query_names(domain)]
+    print(f"🔥 Pre-warming {len(names)} names for {len(domains)} domains into {cache_path}")
+    counts = cache.prewarm(names)
+    print(f"✅ {counts['records']} with records, {counts['negative']} negative, {counts['failed']} failed")
 
 # Test function
 def main():
     """
     Test the email authentication checker with common domains
     """
-    checker = EmailAuthChecker()
+    checker = shared_checker()
     
     test_domains = [
         'gmail.com',
@@ -359,4 +560,13 @@ def main():
     print("✅ Testing completed!")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="PhishGuard SPF/DKIM/DMARC checker")
+    parser.add_argument("--prewarm", metavar="DOMAINS_FILE",
+                        help="resolve every auth record of these domains (one per line) into --dns-cache")
+    parser.add_argument("--dns-cache", metavar="DB", default="dns_cache.db",
+                        help="SQLite DNS cache file to pre-warm (default: dns_cache.db)")
+    args = parser.parse_args()
+    if args.prewarm:
+        prewarm(args.prewarm, args.dns_cache)
+    else:
+        main()
@@ -0,0 +1,210 @@
+"""
+Pluggable TXT resolver backends for EmailAuthChecker
+
+Every backend has txt(name, lifetime=None) -> (strings, ttl) and raises
+dns.resolver.NXDOMAIN / NoAnswer for negative answers, like
+dns.resolver.Resolver.resolve(); lifetime caps a network lookup's duration:
+
+  SystemResolverBackend  - the system's DNS servers (default)
+  FixtureResolverBackend - a local JSON fixture or BIND zone file, for offline
+                           analysis cells and deterministic benchmarks
+  SQLiteCacheBackend     - persistent on-disk cache of resolved records in front
+                           of another backend, or on its own when offline;
+                           can be pre-warmed in bulk
+
+resolver_backend_from_env() picks one from PHISHGUARD_DNS_FIXTURE,
+PHISHGUARD_DNS_CACHE and PHISHGUARD_DNS_OFFLINE.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+import dns.exception
+import dns.rdataclass
+import dns.rdatatype
+import dns.resolver
+import dns.zone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+FIXTURE_DEFAULT_TTL = 3600  # seconds, for JSON fixture entries without a "ttl"
+STALE_TTL = 60  # seconds a stale on-disk answer is trusted when the upstream can't be reached
+PREWARM_WORKERS = 32
+
+def normalize(name: str) -> str:
+    return name.lower().rstrip('.')
+
+class SystemResolverBackend:
+    """Queries the system's DNS servers through dnspython"""
+    def __init__(self, timeout=10):
+        self.resolver = dns.resolver.Resolver()
+        self.resolver.timeout = timeout
+        self.resolver.lifetime = timeout
+
+    def txt(self, name: str, lifetime: Optional[float] = None) -> Tuple[List[str], int]:
+        answers = self.resolver.resolve(name, 'TXT', lifetime=lifetime)
+        strings = [txt_string.decode('utf-8', errors='replace').strip()
+                   for rdata in answers for txt_string in rdata.strings]
+        return strings, answers.rrset.ttl
+
+class FixtureResolverBackend:
+    """
+    Answers from a local file; names not in it are NXDOMAIN
+
+    A .json fixture maps names to TXT strings, either a list or
+    {"TXT": [...], "ttl": 300}; any other file is read as a zone file
+    (it must set $ORIGIN).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.records = self.load_json(path) if path.endswith('.json') else self.load_zone(path)
+
+    @staticmethod
+    def load_json(path: str) -> Dict[str, Tuple[Optional[List[str]], int]]:
+        with open(path) as f:
+            data = json.load(f)
+        records = {}
+        for name, entry in data.items():
+            if isinstance(entry, dict):
+                records[normalize(name)] = (entry.get('TXT'), entry.get('ttl', FIXTURE_DEFAULT_TTL))
+            else:
+                records[normalize(name)] = (list(entry), FIXTURE_DEFAULT_TTL)
+        return records
+
+    @staticmethod
+    def load_zone(path: str) -> Dict[str, Tuple[Optional[List[str]], int]]:
+        zone = dns.zone.from_file(path, relativize=False, check_origin=False)
+        records = {}
+        for name, node in zone.nodes.items():
+            rdataset = node.get_rdataset(dns.rdataclass.IN, dns.rdatatype.TXT)
+            if rdataset is None:
+                records[normalize(name.to_text())] = (None, FIXTURE_DEFAULT_TTL)
+                continue
+            strings = [txt_string.decode('utf-8', errors='replace').strip()
+                       for rdata in rdataset for txt_string in rdata.strings]
+            records[normalize(name.to_text())] = (strings, rdataset.ttl)
+        return records
+
+    def txt(self, name: str, lifetime: Optional[float] = None) -> Tuple[List[str], int]:
+        entry = self.records.get(normalize(name))
+        if entry is None:
+            raise dns.resolver.NXDOMAIN()
+        strings, ttl = entry
+        if not strings:
+            raise dns.resolver.NoAnswer()
+        return list(strings), ttl
+
+class SQLiteCacheBackend:
+    """
+    Persistent cache of TXT answers (and NXDOMAIN / NoAnswer) in a SQLite file
+
+    Fresh rows are answered from disk. Missing or expired rows are resolved
+    through upstream and stored; if there is no upstream (offline) or it fails,
+    an expired row is served rather than nothing.
+    """
+    def __init__(self, path: str, upstream=None, negative_ttl=300):
+        self.upstream = upstream
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS dns_records (
+                    name TEXT NOT NULL,
+                    rdtype TEXT NOT NULL,
+                    error TEXT,
+                    strings TEXT,
+                    expires INTEGER NOT NULL,
+                    PRIMARY KEY (name, rdtype)
+                )
+            """)
+
+    def load(self, name: str) -> Optional[Tuple[Optional[str], Optional[List[str]], int]]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT error, strings, expires FROM dns_records WHERE name = ? AND rdtype = 'TXT'",
+                (normalize(name),)).fetchone()
+        if row is None:
+            return None
+        error, strings, expires = row
+        return error, json.loads(strings) if strings else None, expires
+
+    def store(self, name: str, error: Optional[str], strings: Optional[List[str]], ttl: int):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO dns_records VALUES (?, 'TXT', ?, ?, ?)",
+                              (normalize(name), error, json.dumps(strings) if strings is not None else None,
+                               int(time.time()) + ttl))
+
+    def resolve_upstream(self, name: str, lifetime: Optional[float] = None) -> Tuple[List[str], int]:
+        """Asks upstream and records whatever definite answer comes back"""
+        try:
+            strings, ttl = self.upstream.txt(name, lifetime=lifetime)
+        except dns.resolver.NXDOMAIN:
+            self.store(name, 'NXDOMAIN', None, self.negative_ttl)
+            raise
+        except dns.resolver.NoAnswer:
+            self.store(name, 'NoAnswer', None, self.negative_ttl)
+            raise
+        self.store(name, None, strings, ttl)
+        return strings, ttl
+
+    @staticmethod
+    def replay(error: Optional[str], strings: Optional[List[str]], ttl: int) -> Tuple[List[str], int]:
+        if error == 'NXDOMAIN':
+            raise dns.resolver.NXDOMAIN()
+        if error == 'NoAnswer':
+            raise dns.resolver.NoAnswer()
+        return strings, ttl
+
+    def txt(self, name: str, lifetime: Optional[float] = None) -> Tuple[List[str], int]:
+        cached = self.load(name)
+        now = int(time.time())
+        if cached is not None and cached[2] > now:
+            return self.replay(cached[0], cached[1], cached[2] - now)
+        if self.upstream is not None:
+            try:
+                return self.resolve_upstream(name, lifetime)
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+                raise
+            except dns.exception.DNSException:
+                if cached is None:
+                    raise
+        if cached is None:
+            raise dns.exception.DNSException(f'{name} is not in the offline DNS cache')
+        return self.replay(cached[0], cached[1], STALE_TTL)
+
+    def prewarm(self, names: Iterable[str], workers: int = PREWARM_WORKERS) -> Dict[str, int]:
+        """Resolves names through upstream in parallel and stores the answers; returns outcome counts"""
+        if self.upstream is None:
+            raise ValueError('prewarm needs an upstream backend')
+
+        def warm(name):
+            try:
+                self.resolve_upstream(name)
+                return 'records'
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+                return 'negative'
+            except dns.exception.DNSException:
+                return 'failed'
+
+        counts = {'records': 0, 'negative': 0, 'failed': 0}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for outcome in pool.map(warm, names):
+                counts[outcome] += 1
+        return counts
+
+def resolver_backend_from_env(timeout=10):
+    """
+    PHISHGUARD_DNS_FIXTURE=path  answer from a JSON fixture / zone file instead of system DNS
+    PHISHGUARD_DNS_CACHE=path    keep resolved records in a persistent SQLite cache
+    PHISHGUARD_DNS_OFFLINE=1     with the cache: never query upstream, answer from disk only
+    """
+    fixture = os.environ.get('PHISHGUARD_DNS_FIXTURE')
+    backend = FixtureResolverBackend(fixture) if fixture else SystemResolverBackend(timeout)
+    cache_path = os.environ.get('PHISHGUARD_DNS_CACHE')
+    if cache_path:
+        offline = os.environ.get('PHISHGUARD_DNS_OFFLINE', '').lower() in ('1', 'true', 'yes')
+        backend = SQLiteCacheBackend(cache_path, upstream=None if offline else backend)
+    return backend
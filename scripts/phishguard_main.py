@@ -6,7 +6,6 @@ from email import policy
 from email.parser import BytesParser
 import json
 import re
-import tempfile
 import analyzer
 from datetime import datetime
 
@@ -26,7 +25,7 @@ try:
 except ImportError as e:
     print(f"❌ Backend import error: {e}")
     # Fallback function if import fails
-    def check_email_auth(email_input):
+    def check_email_auth(email_input, headers=None):
         return {"error": "Backend module not available"}
 
 def check_file_exists(filename, directory):
@@ -36,16 +35,14 @@ def check_file_exists(filename, directory):
     print(f"📄 Checking {filename} in {directory}: {'✅ EXISTS' if exists else '❌ MISSING'}")
     return exists
 
-def parse_email_headers(raw_bytes):
-    """Parse email headers to extract From domain and other info"""
+def parse_email_headers(parsed_email):
+    """Extract From domain and other info from analyzer.parse_message() output"""
     try:
-        msg = BytesParser(policy=policy.default).parsebytes(raw_bytes)
-        
         # Extract From header and get domain
-        from_header = msg.get('From', '')
-        to_header = msg.get('To', '')
-        date_header = msg.get('Date', '')
-        subject_header = msg.get('Subject', '')
+        from_header = parsed_email['from'] or ''
+        to_header = parsed_email['to'] or ''
+        date_header = parsed_email['date'] or ''
+        subject_header = parsed_email['subject'] or ''
         
         email_address = extract_email_from_header(from_header)
         to_address = extract_email_from_header(to_header)
@@ -57,7 +54,7 @@ def parse_email_headers(raw_bytes):
             'from_domain': domain,
             'subject': subject_header,
             'date': date_header,
-            'all_headers': dict(msg.items())
+            'all_headers': parsed_email['headers']
         }
     except Exception as e:
         return {'error': f'Failed to parse email: {str(e)}'}
@@ -82,21 +79,9 @@ def extract_urls_from_text(text):
     urls = re.findall(url_pattern, text)
     return urls
 
-def extract_attachments_from_email(msg):
-    """Extract attachment information from email"""
-    attachments = []
-    if msg.is_multipart():
-        for part in msg.walk():
-            content_disposition = part.get("Content-Disposition", "")
-            if "attachment" in content_disposition:
-                filename = part.get_filename()
-                if filename:
-                    attachments.append({
-                        'filename': filename,
-                        'content_type': part.get_content_type(),
-                        'size': len(part.get_payload(decode=True)) if part.get_payload(decode=True) else 0
-                    })
-    return attachments
+def body_for_analysis(parsed_email):
+    """Plain-text body, or the HTML one for HTML-only mail (common in phishing)"""
+    return parsed_email['body_text'] or parsed_email['body_html']
 
 def format_auth_results_for_dashboard(auth_result):
     """Convert backend auth results to dashboard format"""
@@ -113,23 +98,15 @@ def format_auth_results_for_dashboard(auth_result):
     }
 
 # NEW: Advanced phishing analysis using analyzer.py
-def perform_phishing_analysis(raw_bytes, from_email):
-    """Use analyzer.py to perform comprehensive phishing detection"""
+def perform_phishing_analysis(parsed_email, raw_bytes, from_email, body_text):
+    """Use analyzer.py to perform comprehensive phishing detection on the already parsed email"""
     try:
-        # Create temporary file for analyzer
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.eml') as temp_file:
-            temp_file.write(raw_bytes)
-            temp_file_path = temp_file.name
-        
-        # Use analyzer.py to parse and analyze the email
-        parsed_email = analyzer.parse_eml(temp_file_path)
-        
         # Extract URLs and analyze risks
-        urls = analyzer.extract_urls(parsed_email['body_text'])
+        urls = analyzer.extract_urls(body_text)
         url_risks = analyzer.analyze_url_risk(urls, from_email)
         
         # Find suspicious keywords
-        suspicious_keywords = analyzer.find_suspicious_keywords(parsed_email['body_text'])
+        suspicious_keywords = analyzer.find_suspicious_keywords(body_text)
         
         # Analyze attachment risks
         attachments_with_risk = analyzer.analyze_attachment_risk(parsed_email['attachments'])
@@ -140,9 +117,6 @@ def perform_phishing_analysis(raw_bytes, from_email):
         # Classify overall risk
         analyzer_risk_level = analyzer.classify_risk(auth_analysis)
         
-        # Clean up temp file
-        os.unlink(temp_file_path)
-        
         return {
             'phishing_analysis': {
                 'urls_detected': url_risks,
@@ -150,7 +124,7 @@ def perform_phishing_analysis(raw_bytes, from_email):
                 'attachments_analyzed': attachments_with_risk,
                 'auth_analysis': auth_analysis,
                 'analyzer_risk_level': analyzer_risk_level,
-                'body_preview': parsed_email['body_text'][:500] + "..." if len(parsed_email['body_text']) > 500 else parsed_email['body_text']
+                'body_preview': body_text[:500] + "..." if len(body_text) > 500 else body_text
             }
         }
     except Exception as e:
@@ -304,9 +278,15 @@ def upload():
         raw_bytes = file.read()
 
         # -----------------------------
-        # Parse headers
+        # Parse once; every step below shares msg / parsed_email
         # -----------------------------
-        headers_info = parse_email_headers(raw_bytes)
+        try:
+            msg = BytesParser(policy=policy.default).parsebytes(raw_bytes)
+            parsed_email = analyzer.parse_message(msg)
+        except Exception as e:
+            return jsonify({"error": f"Failed to parse email: {str(e)}"}), 400
+
+        headers_info = parse_email_headers(parsed_email)
         if "error" in headers_info:
             return jsonify({"error": headers_info["error"]}), 400
 
@@ -316,13 +296,14 @@ def upload():
         # -----------------------------
         # SPF / DKIM / DMARC check
         # -----------------------------
-        auth_result = check_email_auth(from_email)
+        auth_result = check_email_auth(from_email, headers=msg)
         formatted_auth = format_auth_results_for_dashboard(auth_result)
 
         # -----------------------------
         # Phishing analysis (analyzer.py)
         # -----------------------------
-        phishing_analysis = perform_phishing_analysis(raw_bytes, from_email)
+        body_text = body_for_analysis(parsed_email)
+        phishing_analysis = perform_phishing_analysis(parsed_email, raw_bytes, from_email, body_text)
 
         # -----------------------------
         # Risk calculation
@@ -341,23 +322,12 @@ def upload():
         )
 
         # -----------------------------
-        # Parse email body
+        # Email body (from the single parse above)
         # -----------------------------
-        msg = BytesParser(policy=policy.default).parsebytes(raw_bytes)
-
-        body_text = ""
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_type() == "text/plain":
-                    body_text = part.get_payload(decode=True).decode(errors="ignore")
-                    break
-        else:
-            body_text = msg.get_payload(decode=True).decode(errors="ignore")
-
         snippet = body_text[:100] + "..." if len(body_text) > 100 else body_text
 
         urls_detected = extract_urls_from_text(body_text)
-        attachments = extract_attachments_from_email(msg)
+        attachments = [a for a in parsed_email["attachments"] if a["filename"]]
 
         # -----------------------------
         # FINAL RESPONSE
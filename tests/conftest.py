@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# backend/ first: the repo root has a db.py and app.py of its own
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+import db
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Points the backend's connection pool at a freshly migrated soc.db in tmp_path."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "soc.db"))
+    db.close_pool()
+    db.init_db()
+    yield
+    db.close_pool()
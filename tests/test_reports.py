@@ -0,0 +1,29 @@
+import io
+import zipfile
+
+import pytest
+
+import app as backend
+
+
+@pytest.fixture
+def client(temp_db):
+    return backend.app.test_client()
+
+
+@pytest.mark.parametrize("ids", ["../../../x", "INC-1,../evil", "INC-1/../../x", "INC-1\n", "INC-中"])
+def test_export_rejects_path_like_ids(client, ids):
+    assert client.get("/api/reports/export", query_string={"ids": ids}).status_code == 400
+
+
+@pytest.mark.parametrize("id", ["..%5Cx", "INC-%E4%B8%AD"])
+def test_download_rejects_path_like_id(client, id):
+    # Non-ASCII ids could not be sent in the latin-1 Content-Disposition header
+    assert client.get(f"/api/alerts/{id}/report/download").status_code == 400
+
+
+def test_export_names_members_after_the_ids(client):
+    res = client.get("/api/reports/export", query_string={"ids": "INC-2026-0001,ALERT-PHISH-1", "format": "json"})
+    assert res.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(res.data)).namelist()
+    assert names == ["SOC_Report_INC-2026-0001.json", "SOC_Report_ALERT-PHISH-1.json"]
@@ -0,0 +1,168 @@
+import time
+
+import pytest
+
+import db
+import app as backend
+import schema
+from schema import SLA_POLICY
+
+
+@pytest.fixture
+def conn(temp_db):
+    conn = db.get_db()
+    yield conn
+    conn.close()
+
+
+def insert_alert(conn, severity, ts_epoch, alert_id="INC-2026-0001"):
+    with conn:
+        conn.execute("""
+            INSERT INTO alerts (alert_id, source, severity, description, status, timestamp, ts_epoch)
+            VALUES (?, 'LOG', ?, ?, 'OPEN', '2026-01-01T00:00:00', ?)
+        """, (alert_id, severity, f"test alert {alert_id}", ts_epoch))
+
+
+def deadline(conn, alert_id="INC-2026-0001"):
+    return conn.execute("SELECT sla_deadline FROM alerts WHERE alert_id = ?", (alert_id,)).fetchone()[0]
+
+
+def test_insert_stamps_deadline_from_severity(conn):
+    insert_alert(conn, "HIGH", 1_000_000)
+    assert deadline(conn) == 1_000_000 + 60 * SLA_POLICY["HIGH"]
+
+
+def test_insert_without_timestamp_has_no_deadline(conn):
+    insert_alert(conn, "HIGH", 0)
+    assert deadline(conn) is None
+
+
+def test_severity_change_moves_deadline(conn):
+    insert_alert(conn, "HIGH", 1_000_000)
+    with conn:
+        conn.execute("UPDATE alerts SET severity = 'LOW' WHERE alert_id = 'INC-2026-0001'")
+    assert deadline(conn) == 1_000_000 + 60 * SLA_POLICY["LOW"]
+
+
+def test_listing_reports_time_left_until_deadline(conn):
+    now = int(time.time())
+    insert_alert(conn, "MEDIUM", now, "INC-2026-0001")
+    insert_alert(conn, "HIGH", now - 3600, "INC-2026-0002")
+    rows = conn.execute(f"SELECT {backend.ALERT_COLUMNS} FROM alerts ORDER BY id").fetchall()
+    assert 0 < rows[0][10] <= 60 * SLA_POLICY["MEDIUM"]
+    assert abs(rows[0][10] - (rows[0][9] - now)) <= 1
+    assert rows[1][10] < 0
+    assert backend.alert_to_json(rows[1])["sla_remaining"] == "EXPIRED"
+
+
+def test_bulk_insert_deadlines_match_python(conn):
+    now = int(time.time())
+    severities = ["HIGH", "MEDIUM", "LOW", "UNKNOWN"]
+    rows = [(f"INC-BULK-{i:05d}", severities[i % 4], f"bulk alert {i}", now - 37 * i) for i in range(4000)]
+    with conn:
+        conn.executemany("""
+            INSERT INTO alerts (alert_id, source, severity, description, status, timestamp, ts_epoch)
+            VALUES (?, 'LOG', ?, ?, 'OPEN', '2026-01-01T00:00:00', ?)
+        """, rows)
+    listed = conn.execute(f"SELECT {backend.ALERT_COLUMNS} FROM alerts ORDER BY id").fetchall()
+    assert len(listed) == len(rows)
+    for (_, severity, _, ts_epoch), r in zip(rows, listed):
+        expected = ts_epoch + 60 * SLA_POLICY.get(severity, 60)
+        assert r[9] == expected
+        # remaining seconds are computed against SQL's "now", which may have ticked
+        assert 0 <= (expected - now) - r[10] <= 2
+    # The startup backfill recomputes the same deadlines in one UPDATE
+    with conn:
+        conn.execute("UPDATE alerts SET sla_deadline = NULL")
+        schema.refresh_derived(conn.cursor())
+    assert conn.execute("SELECT sla_deadline FROM alerts ORDER BY id").fetchall() == [(r[9],) for r in listed]
+
+
+def test_format_sla():
+    assert backend.format_sla(None) == ("N/A", "gray")
+    assert backend.format_sla(-1) == ("EXPIRED", "red")
+    assert backend.format_sla(0) == ("0m 0s", "green")
+    assert backend.format_sla(125) == ("2m 5s", "green")
+
+
+def ack(conn, alert_id="INC-2026-0001"):
+    with conn:
+        conn.execute("UPDATE alerts SET status = 'ACKNOWLEDGED' WHERE alert_id = ?", (alert_id,))
+
+
+def breach_state(conn, alert_id="INC-2026-0001"):
+    return conn.execute("SELECT severity, sla_breached FROM alerts WHERE alert_id = ?", (alert_id,)).fetchone()
+
+
+def breached_total(conn):
+    return conn.execute("SELECT breached FROM alert_durations WHERE id = 1").fetchone()[0]
+
+
+def run_escalation(conn, heap, current, now):
+    cur = conn.cursor()
+    backend.load_escalation_changes(cur, -1, heap, current)
+    backend.escalate_due(cur, heap, current, now)
+    conn.commit()
+
+
+def test_late_ack_counts_as_breach(conn):
+    insert_alert(conn, "LOW", int(time.time()) - 60 * SLA_POLICY["LOW"] - 60)
+    ack(conn)
+    assert breach_state(conn) == ("LOW", 1)
+    assert breached_total(conn) == 1
+
+
+def test_ack_in_time_is_not_a_breach(conn):
+    now = int(time.time())
+    insert_alert(conn, "MEDIUM", now - 60 * SLA_POLICY["MEDIUM"] + 2)
+    heap, current = [], {}
+    backend.load_escalation_changes(conn.cursor(), -1, heap, current)
+    ack(conn)
+    # The worker wakes at the deadline before it has seen the acknowledgement
+    backend.escalate_due(conn.cursor(), heap, current, now + 10)
+    conn.commit()
+    assert breach_state(conn) == ("MEDIUM", 0)
+    assert breached_total(conn) == 0
+
+
+def test_open_alert_past_deadline_is_escalated_and_breached(conn):
+    insert_alert(conn, "MEDIUM", int(time.time()) - 60 * SLA_POLICY["MEDIUM"] - 60)
+    run_escalation(conn, [], {}, time.time())
+    assert breach_state(conn) == ("HIGH", 1)
+    assert breached_total(conn) == 1
+
+
+def test_open_high_alert_past_deadline_is_breached(conn):
+    insert_alert(conn, "HIGH", int(time.time()) - 60 * SLA_POLICY["HIGH"] - 60)
+    run_escalation(conn, [], {}, time.time())
+    assert breach_state(conn) == ("HIGH", 1)
+    assert breached_total(conn) == 1
+    # A later ack of the same alert is not counted again
+    ack(conn)
+    assert breached_total(conn) == 1
+
+
+def test_alerts_before_deadline_are_left_alone(conn):
+    insert_alert(conn, "HIGH", int(time.time()))
+    heap, current = [], {}
+    run_escalation(conn, heap, current, time.time())
+    assert breach_state(conn) == ("HIGH", 0)
+    assert len(heap) == 1
+
+
+def test_rollups_rebuild_to_the_trigger_counts(conn):
+    now = int(time.time())
+    insert_alert(conn, "HIGH", now - 3600, "INC-2026-0001")
+    insert_alert(conn, "LOW", now, "INC-2026-0002")
+    insert_alert(conn, "MEDIUM", now - 7200, "INC-2026-0003")
+    ack(conn, "INC-2026-0002")
+    run_escalation(conn, [], {}, now)
+    with conn:
+        conn.execute("UPDATE alerts SET status = 'CLOSED' WHERE alert_id = 'INC-2026-0003'")
+    durations = conn.execute("SELECT * FROM alert_durations").fetchall()
+    counts = sorted(conn.execute("SELECT * FROM alert_counts WHERE count != 0").fetchall())
+    assert durations[0][5] == 2
+    with conn:
+        schema.rebuild_rollups(conn.cursor())
+    assert conn.execute("SELECT * FROM alert_durations").fetchall() == durations
+    assert sorted(conn.execute("SELECT * FROM alert_counts WHERE count != 0").fetchall()) == counts